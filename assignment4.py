@@ -56,6 +56,21 @@ import matplotlib.gridspec as gridspec
 import seaborn as sns
 import os
 
+from pgn_reader import read_games_df, tokenize_movetext
+from move_pipeline import add_clock_columns, add_eval_columns, add_exp_score_columns, add_move_label_columns, fix_fake_brilliancies, add_prep_columns, player_move_store, move_label_list, default_time_control
+from move_cache import move_cache_path, save_move_table
+from move_features import MoveFeatures
+from move_summary import time_quality_summary, chessboard_data
+from move_cube import MoveCube
+from move_models import fit_models
+from move_resampling import summary_bootstrap, summary_permutation_test
+from profiling import StageProfiler
+from move_plots import chessboard_figure, iter_game_grid_figures, move_time_figure
+
+#every processing stage below runs through the profiler; enabled=True gives a per-stage run report at the end
+#(memory=True adds peak traced memory, cprofile_dir='profiles' a cProfile dump per stage)
+profiler = StageProfiler(enabled=False)
+
 
 # ### What is a PGN file?
 
@@ -89,28 +104,8 @@ with open(file_path[1], "r") as file:
 #importing the dataset (pgn file)
 
 def game_to_df(i):
-    game_metadata = []
-    raw_pgn_text = []
-
-    with open(file_path[i]) as f:
-        lines = f.readlines()
-        newgame = True
-        for line in lines:
-            if newgame == True:
-                newgame = False
-                game_metadata_dict = {}
-            if line[0] == '[':
-                key = list(line[1:-3].split('"'))[0].strip()
-                val = list(line[1:-3].split('"'))[1].strip()
-                game_metadata_dict[key] = val
-            if line[:2] == '1.':
-                raw_pgn_text.append(line)
-                game_metadata.append(game_metadata_dict)
-                newgame = True
-
-    #populate games_df
-    games_df = pd.DataFrame(game_metadata)
-    games_df['raw_pgn'] = raw_pgn_text
+    #games are streamed from the pgn file one at a time (see pgn_reader.py)
+    games_df = read_games_df(file_path[i])
 
     #tiebreaks and index
     games_df['Round'] = games_df['Round'].astype(int)
@@ -118,11 +113,12 @@ def game_to_df(i):
     games_df = games_df.set_index('Round')
 
     #remove columns
-    return games_df[['Event', 'Site', 'Date', 'White', 'Black', 'Result', 'ECO', 'Opening', 'raw_pgn']]
-games_df_2021 = game_to_df(0)
-games_df_2023 = game_to_df(1)
+    return games_df[['Event', 'Site', 'Date', 'White', 'Black', 'Result', 'ECO', 'Opening', 'TimeControl', 'raw_pgn']]
+games_df_2021 = profiler.run('read_2021', game_to_df, 0)
+games_df_2023 = profiler.run('read_2023', game_to_df, 1)
 games_df = pd.concat([games_df_2021, games_df_2023], ignore_index=True)
-games_df['TimeControl'] = ["40/7200:20/3600:900+30"]*25+["1500+10"]*4
+#the 2021 file has no TimeControl tag, it was played at the classical control of 2023
+games_df['TimeControl'] = games_df['TimeControl'].fillna(default_time_control)
 games_df
 
 
@@ -133,35 +129,9 @@ games_df
 
 #converting raw pgn to df
 
-pgns = games_df['raw_pgn']
-cleaned_pgn_dfs = []
-
-# Regular expressions to extract the desired information
-pattern = r'(\d+)\.+ ([KQBNRa-h1-8Ox+-=]+)\s.*?\[%eval (.*?)\].*?\[%clk (.*?)\]'
-
-for pgn in pgns:
-    # Initialize lists to store extracted information
-    move_num_list = []
-    move_list = []
-    eval_list = []
-    clk_list = []
-
-    # Extract information using regex
-    matches = re.findall(pattern, pgn)
-    for match in matches:
-        move_num_list.append(match[0])
-        move_list.append(match[1])
-        eval_list.append(match[2])
-        clk_list.append(match[3])
-
-    # Create DataFrame
-    data = {'Move_num': move_num_list,
-            'Move': move_list,
-            'Evaluation': eval_list,
-            'Timestamp': clk_list}
-    df = pd.DataFrame(data)
-    cleaned_pgn_dfs.append(df)
-cleaned_pgn_dfs[10].head() #sample
+#one pass over the movetext of every game (see tokenize_movetext in pgn_reader.py)
+moves_df = profiler.run('tokenize', tokenize_movetext, games_df['raw_pgn'])
+moves_df[moves_df['Game_num'] == 10].head() #sample
 
 
 # ### Why Modify the Timestamp?
@@ -175,74 +145,15 @@ cleaned_pgn_dfs[10].head() #sample
 
 
 #handling time expenditure for each game
-#TODO: parameterize constants
 
 #figure out the time controls
 time_control_dict = games_df['TimeControl'].value_counts().to_dict()
 print(time_control_dict)
 
-round_count = 0
-for df in cleaned_pgn_dfs:
-    df['Timestamp'] = pd.to_timedelta(df['Timestamp'])
-    #Compute time spent on move considering time controls for classical
-    time_spent = []
-    increment = 1
-    if round_count < 25: #classical games
-        for i in range(len(df)):
-            if i in [0,1]:
-                diff = pd.Timedelta(seconds=7200) - df['Timestamp'].iloc[i]
-                time_spent.append(diff)
-            elif i in [78,79]:
-                diff = df['Timestamp'].iloc[i-2] - df['Timestamp'].iloc[i]
-                time_spent.append(diff + pd.Timedelta(seconds=3600))
-            elif i >= 118:  
-                diff = df['Timestamp'].iloc[i-2] - df['Timestamp'].iloc[i]
-                if not increment < 0:
-                    time_spent.append(diff + pd.Timedelta(seconds=930))
-                    increment = increment - 1
-                else:
-                    time_spent.append(diff + pd.Timedelta(seconds=30))
-            else:
-                diff = df['Timestamp'].iloc[i-2] - df['Timestamp'].iloc[i]
-                time_spent.append(diff)
-        round_count += 1
-        seconds_remaining_before_move = [7200,7200]
-    else: #tiebreak games
-        for i in range(len(df)):
-            if i in [0,1]:
-                diff = pd.Timedelta(seconds=1520) - df['Timestamp'].iloc[i]
-                time_spent.append(diff)
-            else:  
-                diff = df['Timestamp'].iloc[i-2] - df['Timestamp'].iloc[i]
-                time_spent.append(diff + pd.Timedelta(seconds=10))
-        round_count += 1
-        seconds_remaining_before_move = [1500,1500]
-    #Add Time_spent and organize df
-    df['Time_spent'] = time_spent
-    df['Timestamp'] = df['Timestamp'].astype(str)
-    df['Timestamp'] = [x.split()[2] for x in df['Timestamp']]
-    df['Time_spent'] = df['Time_spent'].astype(str)
-    df['Time_spent'] = [x.split()[2] for x in df['Time_spent']]
-    df['Timestamp'] = df['Timestamp'].apply(lambda x: datetime.datetime.strptime(x, '%H:%M:%S').strftime('%H:%M:%S'))
-    df['Time_spent'] = df['Time_spent'].apply(lambda x: datetime.datetime.strptime(x, '%H:%M:%S').strftime('%H:%M:%S'))
-    
-    def time_to_seconds(time_str):
-        time_components = time_str.split(':')
-        hours = int(time_components[0])
-        minutes = int(time_components[1])
-        seconds = int(time_components[2])
-        total_seconds = hours * 3600 + minutes * 60 + seconds
-        return total_seconds
-    df['Seconds_spent'] = df['Time_spent'].apply(time_to_seconds)
-    df['Seconds_remaining'] = df['Timestamp'].apply(time_to_seconds)
-    df['Seconds_spent_by_opponent'] = df['Seconds_spent'].shift(1)
-    df.loc[0,'Seconds_spent_by_opponent'] = 0
-    df['Seconds_spent_by_opponent'] = df['Seconds_spent_by_opponent'].astype(int)
-    
-    seconds_remaining_before_move.extend(df['Seconds_remaining'][:-2].tolist())
-    df['Seconds_remaining'] = seconds_remaining_before_move
-    
-cleaned_pgn_dfs[7].head() #sample
+#the clock rules come from the TimeControl string of each game (see add_clock_columns in move_pipeline.py)
+#the 2023 broadcast credits the first increment twice before its first clock reading
+moves_df = profiler.run('clock', add_clock_columns, moves_df, games_df['TimeControl'], double_first_increment=True)
+moves_df[moves_df['Game_num'] == 7].head() #sample
 
 
 # ### Why Modify the Evaluation?
@@ -256,77 +167,13 @@ cleaned_pgn_dfs[7].head() #sample
 
 
 #handling evaluation changes for each game
-def get_eval_for_pos(evaluation):
-    ranges = [1.5, 0.7, 0.26, -0.26, -0.7, -1.5]
-    gamestate = list(range(-3, 4))[::-1]
-    result = np.select(
-        [evaluation > ranges[0], evaluation > ranges[1], evaluation > ranges[2], evaluation > ranges[3], evaluation > ranges[4], evaluation > ranges[5], evaluation <= ranges[5]],
-        gamestate,
-        default='Unknown'
-    )
-    return result
-
-def override_first_two_move_eval(evaluation):
-    first_four = evaluation[:4]
-    first_four = [float(num) for num in first_four]
-    mean = round((sum(first_four)/len(first_four)),2)
-    evaluation[:4] = [mean]*4
-    return evaluation
-
-for df in cleaned_pgn_dfs:
-    df['Evaluation'] = pd.Series(override_first_two_move_eval(list(df['Evaluation'])))
-    df['Evaluation'] = df['Evaluation'].astype(str)
-    eval_series = list(df['Evaluation'])
-    eval_series_mod = []
-    
-    #replace forced mate evaluations with numeric
-    for element in eval_series:
-        if element.startswith('#'):
-            if element.startswith('#-'):
-                value = -100 / (math.log(float(element[2:])) + 0.1)
-            else:
-                value = 100 / (math.log(float(element[1:])) + 0.1)
-            eval_series_mod.append(round(value, 2))
-        else:
-            eval_series_mod.append(float(element))
-    
-    #add column verbose_eval, numeric_eval, change_eval, gamestate to df  
-    df['Gamestate'] = pd.Series(eval_series_mod).apply(get_eval_for_pos)
-    verbose_eval_list = ['Black is Winning', 'Black is Clearly Better', 'Black is Slightly Better', 'Equal', 'White is Slightly Better', 'White is Clearly Better', 'White is Winning']
-    gamestate_str_list = [str(x) for x in list(range(-3, 4))]
-    mapping = dict(zip(gamestate_str_list, verbose_eval_list))
-    df['Gamestate'] = df['Gamestate'].astype(str)
-    df['Verbose_eval'] = df['Gamestate'].map(mapping)
-    df['Gamestate'] = df['Gamestate'].astype(int)
-    df['Change_gamestate'] = df['Gamestate'].diff()
-    df.loc[0,'Change_gamestate'] = 0
-    
-    #add column numeric_eval, change_eval, and  to df  
-    df['Numeric_eval'] = pd.Series(eval_series_mod)
-    df['Change_eval'] = df['Numeric_eval'].diff()
-    df.loc[0,'Change_eval'] = 0
-    df['Centipawn_loss'] = df['Change_eval']*100  # Create a new column as a copy of the original column
-    df['Centipawn_loss'][df.index % 2 == 0] *= -1  # Multiply the even-numbered rows by -1
-    df['Centipawn_loss'] = df['Centipawn_loss'].astype(int)
-    
-    #add boolean column In_prep to indicate whether player is still in prep
-    starttime = datetime.datetime.strptime(df.loc[0,'Timestamp'], "%H:%M:%S")
-    startseconds = starttime.hour * 3600 + starttime.minute * 60 + starttime.second
-    reasonable_recall_percentage = 0.04
-    time_trouble_threshold = startseconds * 0.1
-    in_prep_cutoff = startseconds * reasonable_recall_percentage
-    df['In_time_trouble'] = df['Seconds_remaining'] < time_trouble_threshold
-    
-    movetimes = df['Seconds_spent']
-    white_movetime = movetimes[movetimes.index % 2 == 0].reset_index(drop=True)
-    black_movetime = movetimes[movetimes.index % 2 != 0].reset_index(drop=True)
-    white_index = (white_movetime > in_prep_cutoff).idxmax()
-    black_index = (black_movetime > in_prep_cutoff).idxmax()
-    white_in_prep = [True]*white_index + [False]*(len(white_movetime) - white_index)
-    black_in_prep = [True]*black_index + [False]*(len(black_movetime) - black_index)
-    in_prep_bool = [val for pair in zip(white_in_prep, black_in_prep) for val in pair]
-    df['In_prep'] = pd.Series(in_prep_bool)
-cleaned_pgn_dfs[11].head() #sample
+
+#mate scores, gamestate and centipawn loss for every move of every game (see add_eval_columns in move_pipeline.py)
+moves_df = profiler.run('eval', add_eval_columns, moves_df)
+
+#add boolean columns In_time_trouble and In_prep to indicate whether player is still in prep (see add_prep_columns in move_pipeline.py)
+moves_df = profiler.run('prep', add_prep_columns, moves_df)
+moves_df[moves_df['Game_num'] == 11].head() #sample
 
 
 # ### What is 'Prep'?
@@ -340,55 +187,18 @@ cleaned_pgn_dfs[11].head() #sample
 
 
 #handling evaluation changes for each move
-game_index = 0
-for df in cleaned_pgn_dfs:
-    #Classify moves
-    df.loc[:, 'Move_label'] = 3
-    df.loc[(df['Centipawn_loss'] > 50) & (abs(df['Change_gamestate']) > 0), 'Move_label'] = 4
-    df.loc[(df['Centipawn_loss'] > 75) & (abs(df['Change_gamestate']) > 1), 'Move_label'] = 5
-    df.loc[(df['Centipawn_loss'] > 100) & (abs(df['Change_gamestate']) > 0), 'Move_label'] = 5
-    df.loc[(df['Centipawn_loss'] > 150) & (abs(df['Change_gamestate']) > 2), 'Move_label'] = 6
-    df.loc[(df['Centipawn_loss'] > 250) & (abs(df['Change_gamestate']) > 1), 'Move_label'] = 6
-    df.loc[(df['Centipawn_loss'] < 25) & (abs(df['Change_gamestate']) == 0), 'Move_label'] = 2
-    df.loc[(df['Centipawn_loss'] < -70) & (abs(df['Change_gamestate']) > 0), 'Move_label'] = 1
-    
-    #Add classification to df
-    move_label_key = [str(x) for x in list(range(1,7))]
-    move_label_list = ['Brilliant', 'Excellent', 'Good', 'Inaccuracy', 'Mistake', 'Blunder']
-    mapping = dict(zip(move_label_key, move_label_list))
-    df['Move_label'] = df['Move_label'].astype(str)
-    df['Verbose_label'] = df['Move_label'].map(mapping)
-    df['Move_label'] = df['Move_label'].astype(int)
-        
-    #add game number to df to prepare merging
-    df['Game_num'] = game_index
-    game_index = game_index + 1
-    
-cleaned_pgn_dfs[5].head() #sample
 
+#classify moves with the rule table (see move_label_rules in move_pipeline.py)
+moves_df = profiler.run('label', add_move_label_columns, moves_df)
+moves_df[moves_df['Game_num'] == 5].head() #sample
 
-# In[8]:
 
+# In[8]:
 
-#let's also do expected game score 
-def get_exp_score_for_pos(evaluation):
-    ranges = np.arange(-2.25, 2.26, 0.5)
-    exp_score = np.arange(0, 1.01, 0.1)
-    if evaluation < ranges[0]:
-        return exp_score[0]
-    elif evaluation > ranges[9]:
-        return exp_score[10]
-    for i in range(len(ranges) - 1):
-        if (evaluation > ranges[i]) & (evaluation <= ranges[i+1]):
-            return round(exp_score[i+1],1)
 
-for df in cleaned_pgn_dfs:
-    df['Expected_game_score'] = pd.Series(df['Numeric_eval']).apply(get_exp_score_for_pos)
-    df['Change_game_score'] = df['Expected_game_score'].diff()
-    df.loc[0,'Change_game_score'] = 0
-    df['Winrate_delta_for_move'] = df['Change_game_score']
-    df['Winrate_delta_for_move'][df.index % 2 == 1] *= -1  # Multiply the odd-numbered rows by -1
-cleaned_pgn_dfs[14].head()
+#let's also do expected game score (see get_exp_score_for_pos in move_pipeline.py)
+moves_df = profiler.run('exp_score', add_exp_score_columns, moves_df)
+moves_df[moves_df['Game_num'] == 14].head()
 
 
 # ### What is a Brilliant Move?
@@ -399,16 +209,16 @@ cleaned_pgn_dfs[14].head()
 # In[9]:
 
 
-#a bit of housekeeping 
-for df in cleaned_pgn_dfs:
-    for i in range(1, len(df)):
-        if (df['Verbose_label'].iloc[i] == 'Brilliant' and df['Verbose_label'].iloc[i-1] == 'Brilliant'):
-            eval_cols = ['Evaluation','Gamestate','Verbose_eval','Numeric_eval','Centipawn_loss','Expected_game_score','Winrate_delta_for_move']
-            change_cols = ['Change_gamestate', 'Change_eval','Change_game_score','Move_label','Verbose_label']
-            df.loc[(i-1),eval_cols] = df.loc[(i-2),eval_cols]
-            df.loc[(i-1),change_cols] = [0,0,0,2,'Excellent']
-            print('Fake Brilliancy')
-            print(df.loc[i-1,['Game_num','Move_num','Move']])
+#a bit of housekeeping (see fix_fake_brilliancies in move_pipeline.py)
+moves_df, fake_brilliancies = profiler.run('fake_brilliancies', fix_fake_brilliancies, moves_df)
+
+#keep the finished move table on disk under the key of the clock rules used above,
+#later runs can load it with cached_move_table(file_path, double_first_increment=True) (see move_cache.py)
+profiler.run('save', save_move_table, moves_df, move_cache_path(file_path, {'double_first_increment': True}))
+
+#one dataframe per game, for the cells below
+cleaned_pgn_dfs = [df.reset_index(drop=True) for _, df in moves_df.groupby('Game_num')]
+fake_brilliancies
 
 
 # ### Move Time to Expected Value
@@ -417,200 +227,52 @@ for df in cleaned_pgn_dfs:
 # In[10]:
 
 
-df_list = cleaned_pgn_dfs[:11] #Let's just look at 2023 Data for now
-
-#let's name our players
-Challenger = "Nepomniachtchi, Ian" #bad practice, I know
-Defender = "Carlsen, Magnus" #bad practice, I know
-challenger = Challenger[:4]
-defender = Defender[-6:]
-
-df_odd_list = []   # List to store DataFrames with odd-numbered rows
-df_even_list = []  # List to store DataFrames with even-numbered rows
-
-for df in df_list:
-    # Split DataFrame into odd and even DataFrames
-    df_odd = df.iloc[1::2]  # Select odd-numbered rows
-    df_even = df.iloc[::2]  # Select even-numbered rows
-    
-    if len(df_odd) < len(df_even):
-        df_odd = df_odd.append(pd.Series([3]), ignore_index=True)
-    elif len(df_even) < len(df_odd):
-        df_even = df_even.append(pd.Series([3]), ignore_index=True)
-    
-    df_odd_list.append(df_odd)
-    df_even_list.append(df_even)
-
-# Create subplots with a 6x3 layout
-fig, axs = plt.subplots(6, 2, figsize=(20, 10))
-
-# Flatten the axs array to iterate over each subplot
-axs = axs.flatten()
-
-# Plot 'Seconds_spent' column for each game as scatter plots
-for i, (df_odd, df_even) in enumerate(zip(df_odd_list, df_even_list)):
-    ax = axs[i]  # Select subplot for current game
-
-    # Rest of the code remains the same
-
-# Plot 'Time_spent' column for each game as scatter plots
-for i, (df_odd, df_even) in enumerate(zip(df_odd_list, df_even_list)):
-    ax = axs[i]  # Select subplot for current game
-    
-    if i % 2 == 0:
-        ax.scatter(df_even['Winrate_delta_for_move']-0.005, df_even['Seconds_spent'], color='#4575b4', label='White ({})'.format(challenger), s=10)
-        ax.scatter(df_odd['Winrate_delta_for_move']+0.005, df_odd['Seconds_spent'], color='#ffd700', label='Black ({})'.format(defender), s=10)
-    else:
-        ax.scatter(df_even['Winrate_delta_for_move']-0.005, df_even['Seconds_spent'], color='#4e9e00', label='White ({})'.format(defender), s=10)
-        ax.scatter(df_odd['Winrate_delta_for_move']+0.005, df_odd['Seconds_spent'], color='#ffd700', label='Black ({})'.format(challenger), s=10)
-
-    ax.set_xlabel('Expected Game Score Affected')
-    ax.set_ylabel('Seconds spent')
-    ax.set_title('Game {}'.format(i+1))
-    ax.legend(loc='upper right', fontsize='small')
-    ax.set_xlim(-1.0, 0.5)
-
-# Adjust spacing between subplots
-plt.tight_layout()
-
-# Display the plots
-plt.show()
+#2021 match (the first 11 games), one small scatter per game (see iter_game_grid_figures in move_plots.py)
+#grid size, pages and sides come from games_df; each player keeps one color whichever pieces they have
+colors_2021 = {'Nepomniachtchi, Ian': '#4575b4', 'Carlsen, Magnus': '#ffd700'}
+for fig in iter_game_grid_figures(moves_df, games_df.iloc[:11], colors=colors_2021):
+    plt.show()
 
 
 # In[11]:
 
 
-df_list = cleaned_pgn_dfs[11:] #Let's just look at 2023 Data for now
-
-#let's name our players
-Challenger = "Ding, Liren"
-Defender = "Nepomniachtchi, Ian"
-challenger = Challenger[:4]
-defender = Defender[:4]
-
-df_odd_list = []   # List to store DataFrames with odd-numbered rows
-df_even_list = []  # List to store DataFrames with even-numbered rows
-
-for df in df_list:
-    # Split DataFrame into odd and even DataFrames
-    df_odd = df.iloc[1::2]  # Select odd-numbered rows
-    df_even = df.iloc[::2]  # Select even-numbered rows
-    
-    if len(df_odd) < len(df_even):
-        df_odd = df_odd.append(pd.Series([3]), ignore_index=True)
-    elif len(df_even) < len(df_odd):
-        df_even = df_even.append(pd.Series([3]), ignore_index=True)
-    
-    df_odd_list.append(df_odd)
-    df_even_list.append(df_even)
-
-# Create subplots with a 6x3 layout
-fig, axs = plt.subplots(6, 3, figsize=(20, 10))
-
-# Flatten the axs array to iterate over each subplot
-axs = axs.flatten()
-
-# Plot 'Seconds_spent' column for each game as scatter plots
-for i, (df_odd, df_even) in enumerate(zip(df_odd_list, df_even_list)):
-    ax = axs[i]  # Select subplot for current game
-
-    # Rest of the code remains the same
+#2023 match, tiebreaks included
+colors_2023 = {'Nepomniachtchi, Ian': '#4575b4', 'Liren, Ding': '#d73027'}
+for fig in iter_game_grid_figures(moves_df, games_df.iloc[11:], colors=colors_2023):
+    plt.show()
 
-# Plot 'Time_spent' column for each game as scatter plots
-for i, (df_odd, df_even) in enumerate(zip(df_odd_list, df_even_list)):
-    ax = axs[i]  # Select subplot for current game
-    
-    if (i % 2 == 0 and not i >= 14) or (i % 2 != 0 and i >= 14):
-        ax.scatter(df_even['Winrate_delta_for_move']-0.005, df_even['Seconds_spent'], color='#4575b4', label='White ({})'.format(defender), s=10)
-        ax.scatter(df_odd['Winrate_delta_for_move']+0.005, df_odd['Seconds_spent'], color='#d73027', label='Black ({})'.format(challenger), s=10)
-    else:
-        ax.scatter(df_even['Winrate_delta_for_move']-0.005, df_even['Seconds_spent'], color='#d73027', label='White ({})'.format(challenger), s=10)
-        ax.scatter(df_odd['Winrate_delta_for_move']+0.005, df_odd['Seconds_spent'], color='#4575b4', label='Black ({})'.format(defender), s=10)
 
-    ax.set_xlabel('Expected Game Score Affected')
-    ax.set_ylabel('Seconds spent')
-    ax.set_title('Game {}'.format(i+1))
-    ax.legend(loc='upper right', fontsize='small')
-    ax.set_xlim(-1.0, 0.5)
+# In[12]:
 
-# Adjust spacing between subplots
-plt.tight_layout()
 
-# Display the plots
-plt.show()
+#the derived columns are computed once for the whole move table and filtered views are cached
+#(see MoveFeatures in move_features.py; move_features is built in the next cell)
+def extract_revelant_cols(player, prep = True, drop = True, only_time_trouble = False, no_time_trouble = False, only_balanced = False, blunders_only = False):
+    return move_features.view(player, prep=prep, drop=drop, only_time_trouble=only_time_trouble, no_time_trouble=no_time_trouble,
+                              only_balanced=only_balanced, blunders_only=blunders_only)
 
 
-# In[12]:
+# In[13]:
 
 
-def extract_revelant_cols(move_data, prep = True, drop = True, reindex = True, only_time_trouble = False, no_time_trouble = False, only_balanced = False, blunders_only = False):
-    if reindex:
-        move_data = move_data.reset_index(drop=True)
-        move_data = move_data.set_index(['Game_num', 'Move_num'])
-    
-    if drop:
-        move_data = move_data[['Seconds_spent','Seconds_remaining','Seconds_spent_by_opponent','In_prep','Expected_game_score','Winrate_delta_for_move','In_time_trouble']]
-        
-    if only_time_trouble:
-        move_data = move_data[move_data['In_time_trouble'] == True]
-    elif no_time_trouble:
-        move_data = move_data[move_data['In_time_trouble'] == False]
-    if only_balanced:
-        move_data = move_data.loc[(move_data['Expected_game_score'] < 0.65) | (move_data['Expected_game_score'] > 0.35)]
-    if blunders_only:
-        move_data = move_data.loc[(move_data['Winrate_delta_for_move'] < -0.15)]
-    
-    move_data['Log_seconds_remaining'] = move_data['Seconds_remaining'].apply(lambda x: math.log(x+1))
-    move_data['Game_Balance'] = move_data['Expected_game_score'].apply(lambda x: 1/(0.1+abs(x-0.5))**.7)
-    move_data['Log_seconds_spent'] = move_data['Seconds_spent'].apply(lambda x: math.log(x+1))
-    move_data['Game_Intensity'] = move_data['Game_Balance'] * (move_data['In_time_trouble'])
-    move_data['Lsec_spent_x_Game_Intensity'] = move_data['Log_seconds_spent'] * move_data['Game_Intensity']
-    move_data['Sec_spent_x_Game_Intensity'] = move_data['Seconds_spent'] * move_data['Game_Intensity']
-    move_data['Lsec_spent_x_No_time_trouble'] = move_data['Log_seconds_spent'] * ~move_data['In_time_trouble']
-    
-    if not prep:
-        move_data = move_data[move_data['In_prep'] == False]
-    return move_data
+#Separating the moves played by the contestants: one table indexed by player, sides come from each game's White/Black tags
+#(see player_move_store in move_pipeline.py)
+moves_by_player = profiler.run('player_split', player_move_store, moves_df, games_df)
 
+nepo_moves_data = moves_by_player.loc['Nepomniachtchi, Ian']
+magnus_moves_data = moves_by_player.loc['Carlsen, Magnus']
+ding_moves_data = moves_by_player.loc['Liren, Ding'] #the 2023 pgn lists him as 'Liren, Ding'
 
-# In[13]:
+move_features = profiler.run('features', MoveFeatures, moves_by_player)
 
+#counts, sums and sums of squares per player, event, game, label, prep, time trouble, ... for quick slices and rollups,
+#e.g. move_cube.query(['Player', 'Verbose_label'], In_prep=False) (see MoveCube in move_cube.py)
+move_cube = profiler.run('cube', MoveCube.from_moves, moves_by_player, games_df)
 
-#Separating the moves played by the contestants into their respective df
-nepo_moves_data = pd.DataFrame()
-magnus_moves_data = pd.DataFrame()
-ding_moves_data = pd.DataFrame()
-
-i = 0
-for df in cleaned_pgn_dfs:
-    if i < 11:
-        if i % 2 == 0:
-            nepo_moves_df = df[df.index % 2 == 0]
-            magnus_moves_df = df[df.index % 2 != 0]
-        else:
-            nepo_moves_df = df[df.index % 2 != 0]
-            magnus_moves_df = df[df.index % 2 == 0]
-    elif i < 25:
-        if i % 2 != 0:
-            nepo_moves_df = df[df.index % 2 == 0]
-            ding_moves_df = df[df.index % 2 != 0]
-        else:
-            nepo_moves_df = df[df.index % 2 != 0]
-            ding_moves_df = df[df.index % 2 == 0]
-    else:
-        if i % 2 != 0:
-            nepo_moves_df = df[df.index % 2 != 0]
-            ding_moves_df = df[df.index % 2 == 0]
-        else:
-            nepo_moves_df = df[df.index % 2 == 0]
-            ding_moves_df = df[df.index % 2 != 0]
-
-    nepo_moves_data = pd.concat([nepo_moves_data, nepo_moves_df], axis=0)
-    if i < 11:
-        magnus_moves_data = pd.concat([magnus_moves_data, magnus_moves_df], axis=0)
-    else:
-        ding_moves_data = pd.concat([ding_moves_data, ding_moves_df], axis=0)
-    i += 1
+#OLS of Winrate_delta_for_move and logit of blunder probability on the features above, every player fitted at once
+#(one row per player, model and term; see move_models.py)
+model_table = profiler.run('models', fit_models, move_features.view(prep=False, drop=False), by='Player')
 
 
 # ### Move Time vs Remaining Time, Move Quality (worse) indicated by point size (bigger) and color(darker)
@@ -619,138 +281,37 @@ for df in cleaned_pgn_dfs:
 # In[14]:
 
 
-#Let's see a scatterplot of Move Time vs Time Left:
+#Let's see a scatterplot of Move Time vs Time Left (moves outside of prep, see move_time_figure in move_plots.py):
 def plot_move_time_time_remaining():
-    
-    def get_useful_cols(df):
-        return_df = df[['Seconds_spent', 'Seconds_remaining', 'Move_label']]
-        return_df['Move_label'] = return_df['Move_label'].apply(lambda x: x**3)
-        return return_df
-
-    magnus_drop_prep = get_useful_cols(extract_revelant_cols(magnus_moves_data, prep=False, drop=False))
-    nepo_drop_prep = get_useful_cols(extract_revelant_cols(nepo_moves_data, prep=False, drop=False))
-    ding_drop_prep = get_useful_cols(extract_revelant_cols(ding_moves_data, prep=False, drop=False))
-    
-    magnus_with_prep = get_useful_cols(extract_revelant_cols(magnus_moves_data, prep=True, drop=False))
-    nepo_with_prep = get_useful_cols(extract_revelant_cols(nepo_moves_data, prep=True, drop=False))
-    ding_with_prep = get_useful_cols(extract_revelant_cols(ding_moves_data, prep=True, drop=False))
-    
-    #plot_titles = ['Drop Prep', 'With Prep']
-    the_dfs = [magnus_drop_prep,nepo_drop_prep,ding_drop_prep, magnus_with_prep,nepo_with_prep,ding_with_prep]
-    
-    plt.figure(figsize=(10,10))
-    gspec = gridspec.GridSpec(7,7)
-    
-    scatter_ax = plt.subplot(gspec[1:,1:])
-    top_hist = plt.subplot(gspec[0,1:], sharex=scatter_ax)
-    side_hist = plt.subplot(gspec[1:,0], sharey=scatter_ax)
-    
-    # Plotting the 1st subplot
-    def draw_subplot(ax, index):
-        ax.scatter(the_dfs[3*index]['Seconds_spent'], the_dfs[3*index]['Seconds_remaining'],
-                    c=the_dfs[3*index]['Move_label'], cmap='Greens', alpha=0.7, label='{}'.format('Magnus'), s=the_dfs[3*index]['Move_label'])
-        ax.scatter(the_dfs[3*index+1]['Seconds_spent'], the_dfs[3*index+1]['Seconds_remaining'],
-                    c=the_dfs[3*index+1]['Move_label'], cmap='Blues', alpha=0.7, label='{}'.format('Nepo'), s=the_dfs[3*index+1]['Move_label'])
-        ax.scatter(the_dfs[3*index+2]['Seconds_spent'], the_dfs[3*index+2]['Seconds_remaining'],
-                    c=the_dfs[3*index+2]['Move_label'], cmap='Reds', alpha=0.7, label='{}'.format('Ding'), s=the_dfs[3*index+2]['Move_label'])
-        ax.set_xlabel('Seconds Spent')
-        ax.set_ylabel('Seconds Remaining')
-        #ax.set_title(plot_titles[index] + "(The Larger/Darker the Point, the Worse the Move)")
-        ax.set_title("The Larger/Darker the Point, the Worse the Move")
-        ax.set_xlim(0, 2400)
-        ax.set_ylim(0, 7200)
-
-        vertical_lines = [60, 120, 300, 600, 1200]
-        vertical_annotations = ['1 min', '2 min', '5 min', '10 min', '20 min']
-        for line, annotation in zip(vertical_lines, vertical_annotations):
-            ax.axvline(line, color='green', linestyle='--', linewidth=0.5)
-            ax.annotate(annotation, xy=(line, 0), xycoords='data', xytext=(18, 8), textcoords='offset points',
-                         ha='center', va='center', color='green')
-
-        horizontal_lines = [60, 300, 900, 1800, 3600]
-        horizontal_annotations = ['1 min', '5 min', '15 min', '30 min', '1 hour']
-        for line, annotation in zip(horizontal_lines, horizontal_annotations):
-            ax.axhline(line, color='green', linestyle='--', linewidth=0.5)
-            ax.annotate(annotation, xy=(0, line), xycoords='data', xytext=(5, 5), textcoords='offset points',
-                         ha='left', va='center', color='green')
-        
-        def curt(x):
-            return x**(1/3)
-        def curt_inv(x):
-            return np.power(x, 3)
-        
-        ax.set_yscale('function', functions=(curt, curt_inv))
-        ax.set_xscale('function', functions=(curt, curt_inv))
-
-        legend_patches = [mpatches.Patch(color='green', label='{}'.format('Magnus')),
-                          mpatches.Patch(color='red', label='{}'.format('Ding')),
-                          mpatches.Patch(color='blue', label='{}'.format('Nepo'))]
-        ax.legend(handles=legend_patches)
-
-        
-    draw_subplot(scatter_ax,0)
-    
-    y_bins = [x**3 for x in np.arange(0.5,20,0.5)]
-    x_bins = [x**3 for x in np.arange(0.5,14,0.5)]
-    
-    # Plotting histograms on x and y axes
-    top_hist.hist(the_dfs[0]['Seconds_spent'], bins=x_bins, color='gray', alpha=0.7)
-    side_hist.hist(the_dfs[0]['Seconds_remaining'], bins=y_bins, orientation='horizontal', color='gray', alpha=0.7)
-    side_hist.invert_xaxis()
-    # Removing x and y ticks from histograms
-    top_hist.tick_params(axis='x', which='both', bottom=False, top=False, labelbottom=False)
-    side_hist.tick_params(axis='y', which='both', left=False, right=False, labelleft=False)
-
-    for ax in [top_hist, scatter_ax]:
-        ax.set_xlim(0,2500)
-    for ax in [side_hist, scatter_ax]:
-        ax.set_ylim(0,7000)
-    #draw_subplot(ax2,1)
-
-    # Adjusting the spacing between subplots
-    plt.tight_layout()
-
-    # Displaying the plot
+    players = [('Magnus', extract_revelant_cols('Carlsen, Magnus', prep=False, drop=False)),
+               ('Nepo', extract_revelant_cols('Nepomniachtchi, Ian', prep=False, drop=False)),
+               ('Ding', extract_revelant_cols('Liren, Ding', prep=False, drop=False))]
+    move_time_figure(players)
     plt.show()
 
 
 # In[15]:
 
 
-m_no_prep = extract_revelant_cols(magnus_moves_data, prep = False, drop = False)
-n_no_prep = extract_revelant_cols(nepo_moves_data, prep = False, drop = False)
-d_no_prep = extract_revelant_cols(ding_moves_data, prep = False, drop = False)
-
-m_yes_prep = extract_revelant_cols(magnus_moves_data, prep = True, drop = False)
-n_yes_prep = extract_revelant_cols(nepo_moves_data, prep = True, drop = False)
-d_yes_prep = extract_revelant_cols(ding_moves_data, prep = True, drop = False)
-
-def time_move_quality_summary_df(df, player = 'Nepo'):
-    player_time_by_quality = df.groupby('Verbose_label')['Seconds_spent'].mean().reset_index().round(2)
-    player_time_remaining = df.groupby('Verbose_label')['Seconds_remaining'].mean().reset_index().round(2)
-    value_counts = df['Verbose_label'].value_counts().reset_index()
-    value_counts.columns = ['Verbose_label', '{}_Moves_Count'.format(player)]
-    player_time_by_quality = pd.merge(pd.merge(player_time_by_quality, player_time_remaining, on='Verbose_label'), value_counts, on='Verbose_label')
-    player_time_by_quality.columns = ['Move_Type', '{}_Seconds_Spent'.format(player),'{}_Seconds_Remaining'.format(player),'{}_Moves_Count'.format(player)]
-    return player_time_by_quality
+#time spent and left, and move counts, by move type for every player, with and without prep, in one grouped pass
+#(see time_quality_summary in move_summary.py; one row per player, prep flag and move type)
+time_by_quality = profiler.run('summary', time_quality_summary, moves_by_player)
+short_names = {'Carlsen, Magnus': 'Magnus', 'Nepomniachtchi, Ian': 'Nepo', 'Liren, Ding': 'Ding'}
 
 def final_vis_prep_or_not(prep=False):
-    if prep:
-        df_m = m_yes_prep.copy()
-        df_n = n_yes_prep.copy()
-        df_d = d_yes_prep.copy()
-    else:
-        df_m = m_no_prep.copy()
-        df_n = n_no_prep.copy()
-        df_d = d_no_prep.copy()
-
-    m_time_by_quality = time_move_quality_summary_df(df_m[['Verbose_label', 'Seconds_spent', 'Seconds_remaining']], 'Magnus')
-    n_time_by_quality = time_move_quality_summary_df(df_n[['Verbose_label', 'Seconds_spent', 'Seconds_remaining']], 'Nepo')
-    d_time_by_quality = time_move_quality_summary_df(df_d[['Verbose_label', 'Seconds_spent', 'Seconds_remaining']], 'Ding')
-
-    df_time_by_quality = pd.concat([m_time_by_quality.set_index('Move_Type'), n_time_by_quality.set_index('Move_Type'), d_time_by_quality.set_index('Move_Type')], axis=1)
-    df_time_by_quality = df_time_by_quality.iloc[1:].append(df_time_by_quality.iloc[0])
-    return df_time_by_quality.drop('Brilliant')
+    summary = time_by_quality[(time_by_quality['Includes_prep'] == prep) & time_by_quality['Player'].isin(list(short_names))]
+    summary = summary.assign(Player=summary['Player'].map(short_names), Move_Type=summary['Verbose_label'].astype(str))
+    table = summary.pivot(index='Move_Type', columns='Player', values=['Seconds_spent_mean', 'Seconds_remaining_mean', 'Moves'])
+    table.columns = ['{}_{}'.format(player, value) for value, player in table.columns]
+    columns = ['{}_{}'.format(player, value) for player in short_names.values() for value in ['Seconds_spent_mean', 'Seconds_remaining_mean', 'Moves']]
+    return table.reindex(index=move_label_list[1:], columns=columns)
+#how sure are we? 95% intervals with whole games resampled, and a permutation test of Ding against Nepo outside of prep
+#(see move_resampling.py; coefficient_bootstrap does the same for the model_table coefficients)
+#workers=1 keeps the resampling in this process: worker processes would re-run this script when it is run without a main guard
+moves_no_prep = move_features.view(prep=False, drop=False)
+time_by_quality_intervals = profiler.run('bootstrap', summary_bootstrap, moves_no_prep, n_resamples=10000, workers=1)
+ding_vs_nepo = profiler.run('permutation_test', summary_permutation_test, moves_no_prep, 'Liren, Ding', 'Nepomniachtchi, Ian', n_resamples=10000, workers=1)
+
 df_time_by_quality = final_vis_prep_or_not(True)
 df_time_by_quality
 
@@ -760,56 +321,13 @@ df_time_by_quality
 # In[16]:
 
 
-def sns_df_mapping(df, player = 'Nepo'):
-    df['shape'] = player
-    df = df.reset_index()
-    df.columns = ['color', 'x', 'y', 'size', 'shape']
-    return df
-def merge_players_data(df_time_by_quality):
-    m_sns_df = df_time_by_quality.iloc[:,:3]
-    n_sns_df = df_time_by_quality.iloc[:,3:6]
-    d_sns_df = df_time_by_quality.iloc[:,6:]
-    msns = sns_df_mapping(m_sns_df, 'Magnus')
-    nsns = sns_df_mapping(n_sns_df, 'Nepo')
-    dsns = sns_df_mapping(d_sns_df, 'Ding')
-    sns_data = pd.concat([msns, nsns, dsns], axis=0)
-    sns_data = sns_data.reset_index()
-    return sns_data
+#one marker per player, straight from the tidy summary (see chessboard_data in move_summary.py)
+def merge_players_data(time_by_quality, prep=False):
+    return chessboard_data(time_by_quality, prep=prep, players=short_names)
 
+#chessboard background, one marker per player and move type (see chessboard_figure in move_plots.py)
 def plot_chessboard_vis(sns_data, title = "No Prep"):
-    fig, ax = plt.subplots(figsize=(8, 8))
-    plt.gca().xaxis.set_major_locator(plt.MultipleLocator(50))
-    plt.gca().yaxis.set_major_locator(plt.MultipleLocator(500))
-    plt.xlim(0,400)
-    plt.ylim(0,4000)
-    x_ticks = range(0, 401, 50)
-    y_ticks = range(0, 4001, 500)
-
-    for i in range(len(x_ticks) - 1):
-        for j in range(len(y_ticks) - 1):
-            if (i + j) % 2 == 0:
-                plt.fill_between([x_ticks[i], x_ticks[i + 1]], y_ticks[j], y_ticks[j + 1], facecolor='#B58863')
-            else:
-                plt.fill_between([x_ticks[i], x_ticks[i + 1]], y_ticks[j], y_ticks[j + 1], facecolor='#F0D9B5')        
-
-    sns.scatterplot(data=sns_data, x='x', y='y', size='size', style='shape', hue='color', sizes=(50, 2000), legend = False,
-                    markers=['P', 'o', '*'], palette = ['#95BC4A', '#96AF8B', '#F5BF45', '#E58E2A', '#CA3431'])
-
-    stars = sns_data[sns_data['shape'] == 'Ding']
-    circles = sns_data[sns_data['shape'] == 'Nepo']
-    crosses = sns_data[sns_data['shape'] == 'Magnus']
-
-    plt.xlabel('Seconds Spent on Move')
-    plt.ylabel('Seconds Remaining After Move')
-    plt.title('Relationship Between Move Time v.s. Time left Given Move Quality ({})'.format(title))
-
-    legend_labels = dict(zip(list(sns_data.loc[:5,'color']),['#95BC4A', '#96AF8B', '#F5BF45', '#E58E2A', '#CA3431']))
-    legend_handles = []
-    for label, color in legend_labels.items():
-        scatter = plt.scatter([], [], color=color, label=label)
-        legend_handles.append(scatter)
-    plt.legend(handles=legend_handles, loc='lower right')
-    
+    chessboard_figure(sns_data, title)
     plt.show()
     return None
 
@@ -819,10 +337,13 @@ def plot_chessboard_vis(sns_data, title = "No Prep"):
 # In[17]:
 
 
-plot_chessboard_vis(merge_players_data(final_vis_prep_or_not(True)),title = 'Including Prep')
-plot_chessboard_vis(merge_players_data(final_vis_prep_or_not(False)))
+profiler.run('plot_chessboard', plot_chessboard_vis, merge_players_data(time_by_quality, prep=True),title = 'Including Prep')
+profiler.run('plot_chessboard', plot_chessboard_vis, merge_players_data(time_by_quality, prep=False))
+
+profiler.run('plot_move_time', plot_move_time_time_remaining)
 
-plot_move_time_time_remaining()
+#per-stage run report (empty unless the profiler above is enabled)
+profiler.report()
 
 
 # # 5 Discussion
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Pipeline benchmarks on synthetic PGNs
+#
+# Writes lichess-broadcast style games ([%eval] and [%clk] in every move comment) of
+# any size, then times every stage of the pipeline on them one after another.
+# Each stage is run twice: once for wall time, once under tracemalloc for its peak
+# memory, so the tracing overhead never shows up in the timings. Results go to a
+# JSON file that can be compared between versions.
+#
+#   python benchmark.py --games 100 1000 --plies 80 --output benchmark_results.json
+#
+# --startup also times cold starts in fresh interpreters: the CLI's ingest command
+# on an already cached file against the imports the notebook begins with.
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from pgn_reader import read_pgn_files, tokenize_movetext
+from move_pipeline import (add_clock_columns, add_eval_columns, add_exp_score_columns, add_move_label_columns,
+                           add_prep_columns, default_time_control, fix_fake_brilliancies, player_move_store)
+from move_summary import time_quality_summary
+from move_cube import MoveCube
+from move_models import fit_models
+from move_resampling import summary_bootstrap
+
+
+# ### Synthetic PGN
+
+synthetic_players = ['Carlsen, Magnus', 'Nepomniachtchi, Ian', 'Liren, Ding', 'Caruana, Fabiano', 'Firouzja, Alireza', 'Nakamura, Hikaru']
+synthetic_moves = ['e4', 'e5', 'd4', 'd5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'Nf6', 'O-O', 'Be7', 'Re1', 'b5', 'Bb3', 'c3',
+                   'h3', 'Qxd4', 'exd4', 'Nxe5', 'Rxd8+', 'Kh7', 'Qb8', 'O-O-O', 'e8=Q', 'Bxf7+', 'g3', 'Kg8', 'Rad1', 'c5']
+
+
+def format_clock(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    return '{}:{:02d}:{:02d}'.format(hours, *divmod(rest, 60))
+
+
+def synthetic_game(rng, round_num, plies, start_seconds=5400, increment=30):
+    white, black = rng.sample(synthetic_players, 2)
+    result = rng.choice(['1-0', '0-1', '1/2-1/2'])
+    tags = [('Event', 'Synthetic Championship'), ('Site', 'benchmark'), ('Date', '2024.01.01'), ('Round', str(round_num)),
+            ('White', white), ('Black', black), ('Result', result), ('ECO', 'C65'), ('Opening', 'Ruy Lopez'),
+            ('TimeControl', '{}+{}'.format(start_seconds, increment))]
+
+    movetext = []
+    clocks = [start_seconds, start_seconds]
+    evaluation = 0.2
+    for ply in range(plies):
+        side = ply % 2
+        clocks[side] = max(0, clocks[side] + increment - int(rng.expovariate(1 / 60)))
+        evaluation += rng.gauss(0, 0.3)
+        #now and then a forced mate
+        if rng.random() < 0.01:
+            eval_text = '#{}'.format(rng.choice([-1, 1]) * rng.randint(1, 9))
+        else:
+            eval_text = '{:.2f}'.format(evaluation)
+        comment = '[%eval {}] [%clk {}]'.format(eval_text, format_clock(clocks[side]))
+        number = '{}.'.format(ply // 2 + 1) if side == 0 else '{}...'.format(ply // 2 + 1)
+        movetext.append('{} {} {{ {} }}'.format(number, rng.choice(synthetic_moves), comment))
+    movetext.append(result)
+    return '\n'.join('[{} "{}"]'.format(tag, value) for tag, value in tags) + '\n\n' + ' '.join(movetext) + '\n\n'
+
+
+def write_synthetic_pgn(path, games=1000, plies=80, seed=0):
+    #plies is the mean game length; lengths vary by +-50%
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        for round_num in range(1, games + 1):
+            f.write(synthetic_game(rng, round_num, rng.randint(plies // 2, plies * 3 // 2)))
+    return path
+
+
+# ### Stages
+
+def pipeline_stages(pgn_path):
+    #(stage name, function of the previous stage's output), in pipeline order
+    state = {}
+
+    def read():
+        state['games'] = read_pgn_files([pgn_path])
+        return state['games']
+
+    def clock(moves_df):
+        return add_clock_columns(moves_df, state['games']['TimeControl'].fillna(default_time_control))
+
+    def label(moves_df):
+        moves_df = add_exp_score_columns(add_move_label_columns(moves_df))
+        return fix_fake_brilliancies(moves_df)[0]
+
+    def player_split(moves_df):
+        state['store'] = player_move_store(moves_df, state['games'])
+        return state['store']
+
+    return [
+        ('read', lambda _: read()),
+        ('tokenize', lambda games_df: tokenize_movetext(games_df['raw_pgn'])),
+        ('clock', clock),
+        ('eval', add_eval_columns),
+        ('prep', add_prep_columns),
+        ('label', label),
+        ('player_split', player_split),
+        ('summary', time_quality_summary),
+        ('cube', lambda _: MoveCube.from_moves(state['store'], state['games'])),
+        ('cube_query', lambda cube: cube.query(['Player', 'Verbose_label'], In_prep=False, In_time_trouble=False)),
+        ('models', lambda _: fit_models(state['store'], by=['Player', 'In_time_trouble'])),
+        ('bootstrap', lambda _: summary_bootstrap(state['store'], n_resamples=10000, workers=1)),
+    ]
+
+
+def _rows(value):
+    return len(value) if hasattr(value, '__len__') else None
+
+
+def run_stages(pgn_path, memory=True):
+    records = []
+    data = None
+    for name, function in pipeline_stages(pgn_path):
+        start = time.perf_counter()
+        result = function(data)
+        seconds = time.perf_counter() - start
+        record = {'stage': name, 'seconds': round(seconds, 6), 'rows_in': _rows(data), 'rows_out': _rows(result)}
+        if memory:
+            tracemalloc.start()
+            function(data)
+            record['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 3)
+            tracemalloc.stop()
+        records.append(record)
+        data = result
+    return records
+
+
+def startup_seconds(command, repeat=5):
+    #best wall time of a fresh python process running command
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return round(min(times), 4)
+
+
+def run_startup_benchmark(pgn_path, cache_dir, repeat=5):
+    cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+    ingest = [sys.executable, cli, 'ingest', pgn_path, '--cache-dir', cache_dir]
+    subprocess.run(ingest, check=True, stdout=subprocess.DEVNULL)
+    return {
+        'python': startup_seconds([sys.executable, '-c', 'pass'], repeat),
+        'notebook_imports': startup_seconds([sys.executable, '-c', 'import pandas, numpy, matplotlib.pyplot, matplotlib.gridspec, seaborn'], repeat),
+        'cli_ingest_cached': startup_seconds(ingest, repeat),
+    }
+
+
+def run_benchmark(game_counts=(100, 1000), plies=80, repeat=3, seed=0, memory=True, startup=False, workdir=None):
+    runs = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for games in game_counts:
+            pgn_path = write_synthetic_pgn(os.path.join(tmp, 'synthetic_{}.pgn'.format(games)), games, plies, seed)
+            #best of repeat for the timings, memory from the first repeat only
+            repeats = [run_stages(pgn_path, memory=memory and i == 0) for i in range(repeat)]
+            stages = repeats[0]
+            for i, record in enumerate(stages):
+                record['seconds'] = min(r[i]['seconds'] for r in repeats)
+            moves = stages[1]['rows_out']
+            runs.append({'games': games, 'plies': plies, 'moves': moves, 'pgn_bytes': os.path.getsize(pgn_path),
+                         'total_seconds': round(sum(r['seconds'] for r in stages), 6), 'stages': stages})
+        #cold starts on the largest file, with its move table already cached
+        startup_times = run_startup_benchmark(pgn_path, os.path.join(tmp, 'cache')) if startup else None
+    results = {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+        'machine': platform.machine(), 'cpu_count': os.cpu_count(), 'repeat': repeat, 'seed': seed,
+        'runs': runs,
+    }
+    if startup_times:
+        results['startup'] = startup_times
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time and memory-profile every pipeline stage on synthetic PGNs.')
+    parser.add_argument('--games', type=int, nargs='+', default=[100, 1000], help='game counts to benchmark')
+    parser.add_argument('--plies', type=int, default=80, help='mean number of plies per game')
+    parser.add_argument('--repeat', type=int, default=3, help='timings are the best of this many runs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--startup', action='store_true', help='also time cold starts of the CLI and of the notebook imports')
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.games, args.plies, args.repeat, args.seed, memory=not args.no_memory, startup=args.startup)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    for run in results['runs']:
+        print('{games} games, {moves} moves: {total_seconds:.3f}s'.format(**run))
+        for record in run['stages']:
+            print('  {stage:<13}{seconds:>10.4f}s{peak:>12}'.format(peak='{:.1f} MB'.format(record['peak_mb']) if 'peak_mb' in record else '', **record))
+    for name, seconds in results.get('startup', {}).items():
+        print('start-up {:<18}{:>8.3f}s'.format(name, seconds))
+
+
+if __name__ == '__main__':
+    main()
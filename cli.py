@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Command-line entry point
+#
+#   python cli.py ingest WCC2021.pgn WCC2023.pgn            process the games into the move cache
+#   python cli.py ingest --live broadcast.pgn               only the games appended since the last run
+#   python cli.py summarize WCC2021.pgn WCC2023.pgn         time spent and left by move quality per player, with and without prep
+#   python cli.py plot WCC2021.pgn WCC2023.pgn --out figures --format png svg
+#
+# Only the standard library is imported up front; every command imports what it
+# needs when it runs. ingest and summarize never import matplotlib or seaborn;
+# plot renders on the headless Agg backend (render_figures.py), in worker processes
+# unless it runs with --workers 1 or has a single figure to draw, which are rendered in
+# this process. --timing reports the time the command took and whether a plotting
+# library was loaded; benchmark.py --startup measures cold starts against the
+# notebook's imports.
+
+import argparse
+import os
+import sys
+import time
+
+_started = time.perf_counter()
+
+
+def _params(args):
+    #pipeline parameters that are part of the cache key, the same for every command
+    params = {'compact': True} if args.compact else {}
+    if args.double_first_increment:
+        params['double_first_increment'] = True
+    if args.engine:
+        import functools
+        from engine_eval import reevaluate_moves
+        params['reevaluate'] = functools.partial(reevaluate_moves, engine=args.engine, depth=args.depth, nodes=args.nodes,
+                                                 workers=args.engine_workers, cache_path=os.path.join(args.cache_dir, 'evals.sqlite'))
+    return params
+
+
+def _profiler(args):
+    from profiling import StageProfiler
+    return StageProfiler(enabled=bool(args.profile), memory=True)
+
+
+def _player_store(args, profiler):
+    #on a warm cache the pgn files are only hashed, never parsed
+    from move_cache import cached_tables
+    from move_pipeline import player_move_store
+    games_df, moves_df = cached_tables(args.pgn, cache_dir=args.cache_dir, profiler=profiler, **_params(args))
+    return games_df, profiler.run('player_split', player_move_store, moves_df, games_df)
+
+
+def ingest(args, profiler):
+    if args.live:
+        from move_cache import ingest_incremental
+        for path in args.pgn:
+            new_games, new_moves = ingest_incremental(path, cache_dir=args.cache_dir, profiler=profiler, **_params(args))
+            print('{}: {} new games, {} new moves'.format(path, len(new_games), len(new_moves)))
+        return
+
+    from move_cache import games_cache_path, move_cache_path, save_game_table, save_move_table
+    path = move_cache_path(args.pgn, _params(args), args.cache_dir)
+    if os.path.exists(path) and not args.force:
+        print('{} is up to date'.format(path))
+        return
+    if args.workers == 1:
+        from pgn_reader import read_pgn_files
+        from move_pipeline import process_games
+        games_df = profiler.run('read', read_pgn_files, args.pgn)
+        moves_df = process_games(games_df, profiler=profiler, **_params(args))
+        save_game_table(games_df, games_cache_path(args.pgn, _params(args), args.cache_dir))
+    else:
+        from parallel_pipeline import process_pgn_files_parallel
+        moves_df = profiler.run('process', process_pgn_files_parallel, args.pgn, workers=args.workers, **_params(args))
+    profiler.run('save', save_move_table, moves_df, path)
+    print('{} moves of {} games -> {}'.format(len(moves_df), moves_df['Game_num'].nunique(), path))
+
+
+def summarize(args, profiler):
+    from move_summary import time_quality_summary
+    _, store = _player_store(args, profiler)
+    summary = profiler.run('summary', time_quality_summary, store)
+    if args.no_prep:
+        summary = summary[~summary['Includes_prep']].reset_index(drop=True)
+    if args.output:
+        summary.to_csv(args.output, index=False)
+    else:
+        print(summary.to_string())
+
+
+def plot(args, profiler):
+    #figures render on the Agg backend, in worker processes unless there is one worker or one figure to draw,
+    #in which case this process imports matplotlib itself
+    from render_figures import render_figures, report_jobs
+    games_df, store = _player_store(args, profiler)
+    jobs = profiler.run('plot_jobs', report_jobs, store, games_df)
+    status = profiler.run('render', render_figures, jobs, args.out, formats=args.format, workers=args.workers, force=args.force)
+    rendered = sum(state == 'rendered' for state in status.values())
+    print('{} figures rendered, {} unchanged -> {}'.format(rendered, len(status) - rendered, args.out))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Move time and move quality of chess games with [%eval] and [%clk] comments.')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('pgn', nargs='+', help='pgn files, in game order')
+    common.add_argument('--cache-dir', default='cache')
+    common.add_argument('--compact', action='store_true', help='keep the move table in the compact dtype schema')
+    common.add_argument('--double-first-increment', action='store_true',
+                        help='the clocks were credited the increment twice before the first reading (2023 broadcast)')
+    common.add_argument('--engine', help='re-evaluate every position with this UCI engine command instead of the [%%eval] comments')
+    common.add_argument('--depth', type=int, default=18, help='engine search depth')
+    common.add_argument('--nodes', type=int, help='engine node limit per position')
+    common.add_argument('--engine-workers', type=int, default=1, help='engine processes searching in parallel')
+    common.add_argument('--profile', metavar='REPORT', help='write a per-stage run report (json) here')
+    common.add_argument('--timing', action='store_true', help='report the time the command took and the plotting libraries it loaded')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = commands.add_parser('ingest', parents=[common], help='process pgn files into the move cache')
+    ingest_parser.add_argument('--workers', type=int, default=1, help='processes, one per file (0: one per cpu)')
+    ingest_parser.add_argument('--live', action='store_true', help='only ingest games appended since the last run')
+    ingest_parser.add_argument('--force', action='store_true', help='reprocess even if the cache is up to date')
+    ingest_parser.set_defaults(run=ingest)
+
+    summarize_parser = commands.add_parser('summarize', parents=[common], help='time spent and left by move quality per player')
+    summarize_parser.add_argument('--no-prep', action='store_true', help='only the summary of moves played after leaving opening prep')
+    summarize_parser.add_argument('--output', help='csv file instead of printing')
+    summarize_parser.set_defaults(run=summarize)
+
+    plot_parser = commands.add_parser('plot', parents=[common], help='render the summary figures headlessly')
+    plot_parser.add_argument('--out', default='figures')
+    plot_parser.add_argument('--format', nargs='+', default=['png'], choices=['png', 'svg', 'pdf'])
+    plot_parser.add_argument('--workers', type=int, default=0, help='rendering processes (0: one per cpu)')
+    plot_parser.add_argument('--force', action='store_true', help='render every figure, changed or not')
+    plot_parser.set_defaults(run=plot)
+
+    args = parser.parse_args(argv)
+    if getattr(args, 'workers', 1) == 0:
+        args.workers = None
+
+    profiler = _profiler(args)
+    args.run(args, profiler)
+    if args.profile:
+        profiler.save_report(args.profile)
+    if args.timing:
+        plotting = [name for name in ('matplotlib', 'seaborn') if name in sys.modules]
+        print('{} took {:.3f}s after interpreter start-up, plotting libraries loaded: {}'.format(
+            args.command, time.perf_counter() - _started, ', '.join(plotting) or 'none'), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Re-evaluation of the games' positions with a local UCI engine
+#
+# The [%eval] comments of a broadcast come from quick engine runs and are noisy
+# (hence fix_fake_brilliancies). reevaluate_moves replays every game
+# (pgn_positions.py) and sends the positions to a pool of persistent UCI engine
+# processes searching to a fixed depth and/or node count. The scores are written
+# back into the Evaluation column in [%eval] notation, so add_eval_columns turns
+# them into Numeric_eval, Gamestate and Centipawn_loss as before. Scores are kept
+# in a sqlite file keyed by search settings and normalized FEN. Transpositions and
+# openings that repeat across games are searched once, and a re-run with the same
+# settings never starts an engine.
+#
+#   reevaluate = functools.partial(reevaluate_moves, engine='stockfish', depth=20, workers=4)
+#   moves_df = process_games(games_df, reevaluate=reevaluate)
+#
+# stub_engine.py stands in for a real engine where none is installed.
+
+import json
+import os
+import queue
+import re
+import shlex
+import sqlite3
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from pgn_positions import add_position_columns, game_start_fens
+
+
+uci_score = re.compile(r'\bscore (cp|mate) (-?\d+)')
+uci_multipv = re.compile(r'\bmultipv (\d+)')
+
+
+def engine_command(engine):
+    #'stockfish' or 'path/to/engine --flag' or an argument list
+    return shlex.split(engine) if isinstance(engine, str) else list(engine)
+
+
+class UciEngine:
+    #one engine process, kept running between searches
+
+    def __init__(self, engine, options=None):
+        command = engine_command(engine)
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        text=True, bufsize=1)
+        self.name = command[0]
+        self._send('uci')
+        for line in self._read_until('uciok'):
+            if line.startswith('id name '):
+                self.name = line[len('id name '):]
+        for name, value in (options or {}).items():
+            self._send('setoption name {} value {}'.format(name, value))
+        self._send('isready')
+        for _ in self._read_until('readyok'):
+            pass
+
+    def _send(self, command):
+        self.process.stdin.write(command + '\n')
+        self.process.stdin.flush()
+
+    def _read_until(self, token):
+        #output lines up to and including the one starting with token
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise RuntimeError('{} exited (code {})'.format(self.name, self.process.poll()))
+            line = line.strip()
+            yield line
+            if line.split(' ', 1)[0] == token:
+                return
+
+    def evaluate(self, fen, depth=None, nodes=None):
+        #score in [%eval] notation from white's side ('0.35', '#-3'); None for a position that is already mate
+        self._send('position fen {}'.format(fen if len(fen.split()) > 4 else fen + ' 0 1'))
+        limits = []
+        if depth is not None:
+            limits.append('depth {}'.format(depth))
+        if nodes is not None:
+            limits.append('nodes {}'.format(nodes))
+        self._send('go ' + (' '.join(limits) or 'depth 1'))
+        score = None
+        for line in self._read_until('bestmove'):
+            #bound scores are from an unfinished aspiration window, the last exact score of the main line is the result
+            multipv = uci_multipv.search(line)
+            if line.startswith('info') and 'bound' not in line and (multipv is None or multipv.group(1) == '1'):
+                score = uci_score.search(line) or score
+        if score is None:
+            return None
+        white_sign = 1 if fen.split()[1] == 'w' else -1
+        kind, value = score.group(1), int(score.group(2))
+        if kind == 'cp':
+            return '{:.2f}'.format(white_sign * value / 100)
+        return '#{}'.format(white_sign * value) if value else None
+
+    def quit(self):
+        try:
+            self._send('quit')
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.quit()
+
+
+class EnginePool:
+    #persistent engines searching in parallel; one thread per engine, the threads only wait on the pipes
+
+    def __init__(self, engine, workers=1, depth=None, nodes=None, options=None):
+        self.depth = depth
+        self.nodes = nodes
+        self.engines = []
+        try:
+            for _ in range(workers):
+                self.engines.append(UciEngine(engine, options))
+        except Exception:
+            self.close()
+            raise
+
+    def _search(self, engine, todo, results):
+        while True:
+            try:
+                i, fen = todo.get_nowait()
+            except queue.Empty:
+                return
+            results[i] = engine.evaluate(fen, self.depth, self.nodes)
+
+    def evaluate(self, fens):
+        #scores of fens, in order
+        todo = queue.SimpleQueue()
+        for item in enumerate(fens):
+            todo.put(item)
+        results = [None] * len(fens)
+        with ThreadPoolExecutor(max_workers=len(self.engines)) as executor:
+            for future in [executor.submit(self._search, engine, todo, results) for engine in self.engines]:
+                future.result()
+        return results
+
+    def close(self):
+        for engine in self.engines:
+            engine.quit()
+        self.engines = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EvalCache:
+    #persistent {(search settings, normalized FEN): score}; sqlite, so every run just adds what it searched
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('create table if not exists evals (settings text, fen text, evaluation text, primary key (settings, fen)) without rowid')
+
+    def get_many(self, settings, fens, batch_size=500):
+        #{fen: score} of the fens already searched with these settings
+        found = {}
+        fens = list(fens)
+        for start in range(0, len(fens), batch_size):
+            batch = fens[start:start + batch_size]
+            rows = self.connection.execute('select fen, evaluation from evals where settings = ? and fen in ({})'.format(','.join('?' * len(batch))),
+                                           [settings] + batch)
+            found.update(rows)
+        return found
+
+    def put_many(self, settings, evaluations):
+        with self.connection:
+            self.connection.executemany('insert or replace into evals values (?, ?, ?)', [(settings, fen, evaluation) for fen, evaluation in evaluations])
+
+    def close(self):
+        self.connection.close()
+
+
+def search_settings(engine, depth=None, nodes=None, options=None):
+    #the part of the cache key that says how a position was searched
+    return json.dumps({'engine': engine_command(engine), 'depth': depth, 'nodes': nodes, 'options': options or {}}, sort_keys=True)
+
+
+def reevaluate_moves(moves_df, games_df=None, engine='stockfish', depth=18, nodes=None, workers=1, options=None,
+                     cache_path='cache/evals.sqlite'):
+    #moves_df with the engine's score of the position after every move as Evaluation, and the position as Fen
+    #games_df (indexed by Game_num) is only needed for games set up from a FEN tag; options are UCI options, e.g. {'Hash': 256}
+    moves_df = add_position_columns(moves_df, game_start_fens(games_df) if games_df is not None else None)
+    fens = pd.unique(moves_df['Fen'])
+    settings = search_settings(engine, depth, nodes, options)
+    cache = EvalCache(cache_path)
+    try:
+        evaluations = cache.get_many(settings, fens)
+        missing = [fen for fen in fens if fen not in evaluations]
+        if missing:
+            with EnginePool(engine, workers, depth, nodes, options) as pool:
+                searched = list(zip(missing, pool.evaluate(missing)))
+            cache.put_many(settings, searched)
+            evaluations.update(searched)
+    finally:
+        cache.close()
+    moves_df['Evaluation'] = moves_df['Fen'].map(evaluations).astype(object)
+    return moves_df
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Figure layout from game metadata
+#
+# Grid sizes, pages and player colors of the per-game small multiples, and the
+# player colors of the move time figure. Kept apart
+# from move_plots.py so figures can be planned (render_figures.report_jobs)
+# without importing matplotlib.
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from move_pipeline import normalize_player_name
+
+
+#colors given to players in order of appearance when no colors are passed
+player_palette = ['#4575b4', '#ffd700', '#d73027', '#4e9e00', '#984ea3', '#ff7f00', '#a65628', '#f781bf', '#999999']
+#(colormap of the points, color of the legend patch) of move_time_figure, taken in turn by players without a color of their own
+player_colors = [('Greens', 'green'), ('Blues', 'blue'), ('Reds', 'red'), ('Purples', 'purple'), ('Oranges', 'orange'), ('Greys', 'gray')]
+#the notebook's players keep its colors in the report
+notebook_player_colors = {'Carlsen, Magnus': player_colors[0], 'Nepomniachtchi, Ian': player_colors[1], 'Liren, Ding': player_colors[2]}
+
+
+def player_color_map(games):
+    #games: White and Black of every game; each player keeps one color across all games and pages
+    names = pd.unique(np.column_stack([normalize_player_name(games['White']), normalize_player_name(games['Black'])]).ravel())
+    return {name: player_palette[i % len(player_palette)] for i, name in enumerate(names)}
+
+
+def grid_shape(n_games, max_rows=6, max_cols=3):
+    #(columns, games per page, pages): at most max_rows x max_cols small multiples per figure
+    ncols = min(max_cols, max(1, math.ceil(n_games / max_rows)))
+    per_page = max_rows * ncols
+    return ncols, per_page, max(1, math.ceil(n_games / per_page))
+
+
+def grid_pages(games, max_rows=6, max_cols=3):
+    #(games on the page, columns, rows, number of the page's first game) for every page
+    ncols, per_page, pages = grid_shape(len(games), max_rows, max_cols)
+    for page in range(pages):
+        page_games = games.iloc[page * per_page:(page + 1) * per_page]
+        yield page_games, ncols, min(max_rows, math.ceil(len(page_games) / ncols)), page * per_page + 1
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# On-disk cache of the finished move table
+#
+# The table is stored as an uncompressed Feather (Arrow IPC) file, so a warm start
+# memory-maps it and reads only the columns it is asked for. The file name is a
+# hash of the source pgn bytes, the pipeline parameters and CACHE_VERSION:
+# changing any of them simply misses the cache. The games' tags are kept under the
+# same key, so a warm start never parses the pgn files. Needs pyarrow.
+#
+# A growing broadcast pgn is ingested incrementally instead: every call parses only
+# the finished games appended since the last one and adds them as a new part file.
+
+import functools
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from pgn_reader import GAME_COLUMNS, game_is_finished, iter_pgn_games, read_pgn_files
+from move_pipeline import process_games
+from profiling import no_profiler
+
+
+#part of every cache key; bump it whenever tokenizing or a pipeline stage changes what it writes
+CACHE_VERSION = 3
+
+
+def _describe(value):
+    #json-able description of a pipeline parameter, stable across runs
+    if isinstance(value, functools.partial):
+        return {'function': _describe(value.func), 'args': _describe(list(value.args)), 'kwargs': _describe(value.keywords)}
+    if callable(value):
+        return '{}.{}'.format(value.__module__, value.__qualname__)
+    if isinstance(value, dict):
+        return {str(k): _describe(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_describe(v) for v in value]
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return value
+
+
+def cache_key(pgn_paths, params=None, block_size=1 << 20):
+    key = hashlib.sha256('v{}\0'.format(CACHE_VERSION).encode())
+    for path in pgn_paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                key.update(block)
+        key.update(b'\0')
+    key.update(json.dumps(_describe(params or {}), sort_keys=True, default=repr).encode())
+    return key.hexdigest()[:20]
+
+
+def move_cache_path(pgn_paths, params=None, cache_dir='cache'):
+    return os.path.join(cache_dir, 'moves_{}.feather'.format(cache_key(pgn_paths, params)))
+
+
+def save_move_table(moves_df, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    #write to a temporary name first so a crashed run never leaves half a cache behind
+    tmp_path = path + '.tmp'
+    moves_df.reset_index(drop=True).to_feather(tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+
+def load_move_table(path, columns=None, memory_map=True, parts='moves-*.feather'):
+    #path is one feather file, or a directory of part files written by ingest_incremental
+    #columns: only these are read from disk (the rest of the file is never touched)
+    import pyarrow
+    from pyarrow import feather
+    if not os.path.isdir(path):
+        return feather.read_table(path, columns=columns, memory_map=memory_map).to_pandas()
+    tables = [feather.read_table(part, columns=columns, memory_map=memory_map) for part in sorted(glob.glob(os.path.join(path, parts)))]
+    if not tables:
+        return pd.DataFrame(columns=columns)
+    return pyarrow.concat_tables(tables, promote_options='default').to_pandas()
+
+
+def games_cache_path(pgn_paths, params=None, cache_dir='cache'):
+    #the games' tags, stored next to the move table they belong to
+    return os.path.join(cache_dir, 'games_{}.feather'.format(cache_key(pgn_paths, params)))
+
+
+def save_game_table(games_df, path):
+    #the movetext is already in the move table; a row's position is its Game_num
+    save_move_table(games_df.drop(columns='raw_pgn', errors='ignore'), path)
+
+
+def cached_move_table(pgn_paths, columns=None, cache_dir='cache', **params):
+    #params are passed on to move_pipeline.process_games and are part of the cache key (except the profiler)
+    profiler = params.pop('profiler', no_profiler)
+    path = move_cache_path(pgn_paths, params, cache_dir)
+    if not os.path.exists(path):
+        save_move_table(process_games(read_pgn_files(pgn_paths), profiler=profiler, **params), path)
+    return load_move_table(path, columns=columns)
+
+
+def cached_tables(pgn_paths, columns=None, cache_dir='cache', **params):
+    #(games, moves) of the pgn files; on a warm cache the files are hashed but never parsed
+    profiler = params.pop('profiler', no_profiler)
+    key = cache_key(pgn_paths, params)
+    moves_path = os.path.join(cache_dir, 'moves_{}.feather'.format(key))
+    games_path = os.path.join(cache_dir, 'games_{}.feather'.format(key))
+    games_df = None
+    if not os.path.exists(moves_path):
+        games_df = profiler.run('read', read_pgn_files, pgn_paths)
+        save_move_table(process_games(games_df, profiler=profiler, **params), moves_path)
+    if not os.path.exists(games_path):
+        #also a move table written without its games (by process_pgn_files_parallel)
+        save_game_table(games_df if games_df is not None else profiler.run('read', read_pgn_files, pgn_paths), games_path)
+    return profiler.run('games', load_move_table, games_path), profiler.run('moves', load_move_table, moves_path, columns)
+
+
+# ### Incremental ingestion
+
+def _tail_fingerprint(path, offset, size=4096):
+    #hash of the bytes just before offset, to notice a file that was rewritten rather than appended to
+    with open(path, 'rb') as f:
+        f.seek(max(0, offset - size))
+        return hashlib.sha256(f.read(offset - max(0, offset - size))).hexdigest()
+
+
+def live_table_dir(pgn_path, params=None, cache_dir='cache'):
+    source = json.dumps([CACHE_VERSION, os.path.abspath(pgn_path), _describe(params or {})], sort_keys=True, default=repr)
+    return os.path.join(cache_dir, 'live_{}'.format(hashlib.sha256(source.encode()).hexdigest()[:20]))
+
+
+def ingest_incremental(pgn_path, cache_dir='cache', **params):
+    #processes the finished games added to pgn_path since the last call and appends them to the cached table
+    #returns (new games, new moves); load_move_table(live_table_dir(...)) gives the whole table
+    profiler = params.pop('profiler', no_profiler)
+    table_dir = live_table_dir(pgn_path, params, cache_dir)
+    state_path = os.path.join(table_dir, 'state.json')
+    state = {'offset': 0, 'game_count': 0, 'parts': 0, 'fingerprint': None}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+        if os.path.getsize(pgn_path) < state['offset'] or _tail_fingerprint(pgn_path, state['offset']) != state['fingerprint']:
+            #the file was replaced, start over
+            shutil.rmtree(table_dir)
+            state = {'offset': 0, 'game_count': 0, 'parts': 0, 'fingerprint': None}
+
+    #stop at the first game that is still being played, it is picked up once it has a result
+    games = []
+    offset = state['offset']
+    for game, game_end in iter_pgn_games(pgn_path, start_offset=state['offset'], with_offsets=True):
+        if not game_is_finished(game):
+            break
+        games.append(game)
+        offset = game_end
+    new_games = pd.DataFrame(games, columns=GAME_COLUMNS)
+    new_games.index = pd.RangeIndex(state['game_count'], state['game_count'] + len(new_games), name='Game_num')
+    if new_games.empty:
+        return new_games, pd.DataFrame()
+
+    new_moves = process_games(new_games, profiler=profiler, **params)
+    new_moves['Game_num'] += state['game_count']
+    save_move_table(new_moves, os.path.join(table_dir, 'moves-{:05d}.feather'.format(state['parts'])))
+    save_move_table(new_games.drop(columns='raw_pgn').reset_index(), os.path.join(table_dir, 'games-{:05d}.feather'.format(state['parts'])))
+
+    state = {'offset': offset, 'game_count': state['game_count'] + len(new_games), 'parts': state['parts'] + 1,
+             'fingerprint': _tail_fingerprint(pgn_path, offset)}
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(state_path + '.tmp', state_path)
+    return new_games, new_moves
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Pre-aggregated move cube
+#
+# The moves are aggregated once into cells, one per combination of the cube
+# dimensions that occurs (player, event, game, color, move label, prep, time
+# trouble, gamestate, balanced position, expected-score blunder, time buckets).
+# Cells only hold additive measures: the move count and the count of known values,
+# sum and sum of squares of a few columns. Any slice or rollup is then a filter and a groupby-sum
+# over a few thousand cells instead of every move, and means and standard
+# deviations follow from the sums. Cells never span games, so adding games only
+# aggregates the new moves; a game added again replaces its cells.
+#
+#   cube = MoveCube.from_moves(moves_by_player, games_df)
+#   cube.query(['Player', 'Verbose_label'], In_prep=False, In_time_trouble=True)
+#   cube.add(new_moves, new_games)    #e.g. what move_cache.ingest_incremental returns
+
+import numpy as np
+import pandas as pd
+
+from move_pipeline import add_player_columns, move_label_list
+
+
+cube_measures = ['Seconds_spent', 'Seconds_remaining', 'Winrate_delta_for_move']
+
+#bucket edges in seconds, the reference lines of move_plots.move_time_figure
+spent_buckets = pd.Series(['<1 min', '1-2 min', '2-5 min', '5-10 min', '10-20 min', '20+ min'], index=[0, 60, 120, 300, 600, 1200])
+remaining_buckets = pd.Series(['<1 min', '1-5 min', '5-15 min', '15-30 min', '30-60 min', '1+ hour'], index=[0, 60, 300, 900, 1800, 3600])
+
+#Balanced and Score_blunder are the only_balanced and blunders_only filters of move_features.MoveFeatures
+cube_dimensions = ['Player', 'Event', 'Game_num', 'Color', 'Verbose_label', 'In_prep', 'In_time_trouble', 'Gamestate',
+                   'Balanced', 'Score_blunder', 'Spent_bucket', 'Remaining_bucket']
+
+
+def time_bucket(seconds, buckets):
+    #ordered categorical of the bucket every value falls in; buckets: labels indexed by their lower edge
+    #a missing time (a game without clocks) has no bucket
+    seconds = np.asarray(seconds, dtype=float)
+    codes = np.clip(np.searchsorted(buckets.index.to_numpy(), seconds, side='right') - 1, 0, None)
+    return pd.Categorical.from_codes(np.where(np.isnan(seconds), -1, codes), categories=buckets.to_list(), ordered=True)
+
+
+def _sum_cols(measures):
+    #<measure>_count: moves where the measure is known, which the means and deviations are taken over
+    return ['Moves'] + [name for measure in measures for name in (measure + '_count', measure + '_sum', measure + '_sumsq')]
+
+
+def cube_cells(moves_df, games_df, measures=cube_measures):
+    #moves_df: a move table, with or without the player columns (a player store works too); games_df indexed by Game_num
+    if 'Player' not in moves_df.columns:
+        moves_df = moves_df.reset_index() if moves_df.index.name == 'Player' else add_player_columns(moves_df, games_df)
+    game_num = moves_df['Game_num'].to_numpy()
+    expected_score = moves_df['Expected_game_score'].to_numpy()
+    cells = pd.DataFrame({
+        'Player': moves_df['Player'].astype(str).to_numpy(),
+        'Event': games_df['Event'].reindex(game_num).astype(str).to_numpy(),
+        'Game_num': game_num.astype('int64'),
+        'Color': pd.Categorical(moves_df['Color'], categories=['White', 'Black']),
+        'Verbose_label': pd.Categorical(moves_df['Verbose_label'], categories=move_label_list),
+        'In_prep': moves_df['In_prep'].to_numpy(dtype=bool),
+        'In_time_trouble': moves_df['In_time_trouble'].to_numpy(dtype=bool),
+        'Gamestate': moves_df['Gamestate'].to_numpy(dtype='int64'),
+        'Balanced': (expected_score > 0.35) & (expected_score < 0.65),
+        'Score_blunder': moves_df['Winrate_delta_for_move'].to_numpy() < -0.15,
+        'Spent_bucket': time_bucket(moves_df['Seconds_spent'], spent_buckets),
+        'Remaining_bucket': time_bucket(moves_df['Seconds_remaining'], remaining_buckets),
+        'Moves': np.ones(len(moves_df), dtype='int64'),
+    })
+    for measure in measures:
+        values = moves_df[measure].to_numpy(dtype=float)
+        cells[measure + '_count'] = (~np.isnan(values)).astype('int64')
+        cells[measure + '_sum'] = values
+        cells[measure + '_sumsq'] = values * values
+    cells = cells.groupby(cube_dimensions, observed=True, sort=False, dropna=False)[_sum_cols(measures)].sum()
+    return cells.reset_index()
+
+
+def cube_stats(sums, measures=cube_measures):
+    #adds <measure>_mean and <measure>_std (sample) to summed cells
+    sums = sums.copy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for measure in measures:
+            moves = sums[measure + '_count' if measure + '_count' in sums.columns else 'Moves'].to_numpy(dtype=float)
+            total = sums[measure + '_sum'].to_numpy()
+            variance = (sums[measure + '_sumsq'].to_numpy() - total * total / moves) / (moves - 1)
+            sums[measure + '_mean'] = total / moves
+            sums[measure + '_std'] = np.where(moves > 1, np.sqrt(np.clip(variance, 0, None)), np.nan)
+    return sums
+
+
+class MoveCube:
+
+    def __init__(self, cells=None, measures=cube_measures):
+        self.measures = list(measures)
+        self.cells = cells
+
+    @classmethod
+    def from_moves(cls, moves_df, games_df, measures=cube_measures):
+        return cls(cube_cells(moves_df, games_df, measures), measures)
+
+    def add(self, moves_df, games_df):
+        #aggregates only the given moves; cells of games already in the cube are replaced by the new ones
+        new_cells = cube_cells(moves_df, games_df, self.measures)
+        if self.cells is None or self.cells.empty:
+            self.cells = new_cells
+        elif not new_cells.empty:
+            kept = self.cells[~self.cells['Game_num'].isin(new_cells['Game_num'].unique())]
+            self.cells = pd.concat([kept, new_cells], ignore_index=True)
+        return self
+
+    def query(self, by=(), **filters):
+        #sums, means and standard deviations grouped by the dimensions in by (everything rolled up when empty)
+        #filters: dimension=value, or dimension=[values] for any of them
+        for dimension in list(by) + list(filters):
+            if dimension not in cube_dimensions:
+                raise ValueError('{} is not a cube dimension'.format(dimension))
+        cells = self.cells
+        mask = np.ones(len(cells), dtype=bool)
+        for dimension, value in filters.items():
+            column = cells[dimension]
+            mask &= (column.isin(value) if isinstance(value, (list, tuple, set)) else column == value).to_numpy()
+        cells = cells[mask]
+        if by:
+            sums = cells.groupby(list(by), observed=True, dropna=False)[_sum_cols(self.measures)].sum().reset_index()
+        else:
+            sums = cells[_sum_cols(self.measures)].sum().to_frame().T.astype({'Moves': 'int64'})
+        return cube_stats(sums, self.measures)
+
+    def save(self, path):
+        from move_cache import save_move_table
+        save_move_table(self.cells, path)
+
+    @classmethod
+    def load(cls, path):
+        from move_cache import load_move_table
+        cells = load_move_table(path)
+        return cls(cells, [column[:-len('_sum')] for column in cells.columns if column.endswith('_sum')])
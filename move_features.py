@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Model-ready features of the move table
+#
+# The derived columns extract_revelant_cols used to build on every call are computed
+# once, with NumPy, over the whole move table. Filtered views (player, prep, time
+# trouble, balanced positions, blunders) are memoized in an LRU cache, so asking for
+# the same view again is a dictionary lookup.
+
+import functools
+
+import numpy as np
+
+
+relevant_cols = ['Seconds_spent', 'Seconds_remaining', 'Seconds_spent_by_opponent', 'In_prep', 'Expected_game_score', 'Winrate_delta_for_move', 'In_time_trouble']
+feature_cols = ['Log_seconds_remaining', 'Game_Balance', 'Log_seconds_spent', 'Game_Intensity', 'Lsec_spent_x_Game_Intensity', 'Sec_spent_x_Game_Intensity', 'Lsec_spent_x_No_time_trouble']
+
+
+def add_feature_columns(moves_df):
+    moves_df = moves_df.copy()
+    seconds_spent = moves_df['Seconds_spent'].to_numpy(dtype=float)
+    in_time_trouble = moves_df['In_time_trouble'].to_numpy(dtype=bool)
+    moves_df['Log_seconds_remaining'] = np.log(moves_df['Seconds_remaining'].to_numpy(dtype=float) + 1)
+    moves_df['Game_Balance'] = 1 / (0.1 + np.abs(moves_df['Expected_game_score'].to_numpy() - 0.5)) ** .7
+    moves_df['Log_seconds_spent'] = np.log(seconds_spent + 1)
+    moves_df['Game_Intensity'] = moves_df['Game_Balance'] * in_time_trouble
+    moves_df['Lsec_spent_x_Game_Intensity'] = moves_df['Log_seconds_spent'] * moves_df['Game_Intensity']
+    moves_df['Sec_spent_x_Game_Intensity'] = seconds_spent * moves_df['Game_Intensity']
+    moves_df['Lsec_spent_x_No_time_trouble'] = moves_df['Log_seconds_spent'] * ~in_time_trouble
+    return moves_df
+
+
+class MoveFeatures:
+    #moves_df: a move table with a Player column or index (move_pipeline.player_move_store)
+
+    def __init__(self, moves_df, maxsize=64):
+        if 'Player' not in moves_df.columns:
+            moves_df = moves_df.reset_index()
+        moves = add_feature_columns(moves_df.reset_index(drop=True))
+        self.moves = moves.set_index(['Game_num', 'Move_num'])
+        self._player = self.moves['Player'].to_numpy()
+        self._in_prep = self.moves['In_prep'].to_numpy(dtype=bool)
+        self._in_time_trouble = self.moves['In_time_trouble'].to_numpy(dtype=bool)
+        self._expected_score = self.moves['Expected_game_score'].to_numpy()
+        self._winrate_delta = self.moves['Winrate_delta_for_move'].to_numpy()
+        self.mask = functools.lru_cache(maxsize=maxsize)(self._mask)
+        self._view = functools.lru_cache(maxsize=maxsize)(self._select)
+
+    def _mask(self, player=None, prep=True, only_time_trouble=False, no_time_trouble=False, only_balanced=False, blunders_only=False):
+        mask = np.ones(len(self.moves), dtype=bool)
+        if player is not None:
+            mask &= self._player == player
+        if not prep:
+            mask &= ~self._in_prep
+        if only_time_trouble:
+            mask &= self._in_time_trouble
+        elif no_time_trouble:
+            mask &= ~self._in_time_trouble
+        if only_balanced:
+            mask &= (self._expected_score < 0.65) & (self._expected_score > 0.35)
+        if blunders_only:
+            mask &= self._winrate_delta < -0.15
+        mask.flags.writeable = False
+        return mask
+
+    def _select(self, drop, *filters):
+        moves = self.moves[self.mask(*filters)]
+        return moves[relevant_cols + feature_cols] if drop else moves
+
+    def view(self, player=None, prep=True, drop=True, only_time_trouble=False, no_time_trouble=False, only_balanced=False, blunders_only=False):
+        #same filters as the notebook's extract_revelant_cols, indexed by (Game_num, Move_num)
+        view = self._view(drop, player, prep, only_time_trouble, no_time_trouble, only_balanced, blunders_only)
+        #a shallow copy, so callers adding columns do not change the cached frame
+        return view.copy(deep=False)
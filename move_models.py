@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Batched regressions of move quality on the move features
+#
+# OLS of Winrate_delta_for_move and logistic regressions of blunder probability
+# on the features of move_features.add_feature_columns, one model per player or
+# per slice, all fitted at once. Every group's X'WX and X'Wy are accumulated over the
+# flat rows with np.bincount, so memory grows with the moves and not with groups times
+# the largest group; the normal equations (OLS) and the Newton steps (logit) of all
+# groups are then one batched solve of small (terms, terms) systems. A feature that is
+# redundant within a group (Game_Intensity is 0 outside time trouble and equals
+# Game_Balance inside it) is left out of that group's model and reported as NaN.
+# Only NumPy is needed.
+#
+#   fit_models(move_features.moves, by='Player')
+#   fit_ols(move_features.view(prep=False, drop=False), by=['Player', 'In_time_trouble'])
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from move_features import add_feature_columns
+
+
+model_features = ['Log_seconds_spent', 'Game_Balance', 'Game_Intensity', 'Lsec_spent_x_Game_Intensity', 'Lsec_spent_x_No_time_trouble']
+
+
+def _prepare(moves, by, features):
+    #Player back to a column, feature columns added when the table does not have them yet
+    if 'Player' in moves.index.names:
+        moves = moves.reset_index()
+    if any(feature not in moves.columns for feature in features):
+        moves = add_feature_columns(moves)
+    by = [by] if isinstance(by, str) else list(by or [])
+    return moves, by
+
+
+def group_rows(moves, by):
+    #(group keys, group code of every row)
+    if by:
+        grouped = moves.groupby(by, observed=True, sort=True)
+        return grouped.size().index.to_frame(index=False), grouped.ngroup().to_numpy()
+    return pd.DataFrame(index=[0]), np.zeros(len(moves), dtype='int64')
+
+
+def group_sums(code, n_groups, values):
+    #(groups, columns) sums of the rows of values
+    sums = np.empty((n_groups, values.shape[1]))
+    for column in range(values.shape[1]):
+        sums[:, column] = np.bincount(code, weights=values[:, column], minlength=n_groups)
+    return sums
+
+
+def independent_terms(gram, tol=1e-9):
+    #(groups, terms) mask of the terms kept in each group's model, from the groups' X'X: a term is left out when it is,
+    #numerically, a linear combination of the kept terms before it (a constant, or a copy of another feature within a slice)
+    n_groups, n_terms = gram.shape[:2]
+    usable = np.zeros((n_groups, n_terms), dtype=bool)
+    for k in range(n_terms):
+        diagonal = gram[:, k, k]
+        residual = diagonal.copy()
+        if k:
+            kept = usable[:, :k]
+            both = kept[:, :, None] & kept[:, None, :]
+            earlier = np.where(both, gram[:, :k, :k], np.eye(k))
+            cross = gram[:, :k, k] * kept
+            residual -= np.einsum('gi,gi->g', cross, np.linalg.solve(earlier, cross[..., None])[..., 0])
+        usable[:, k] = (diagonal > 0) & (residual > tol * diagonal)
+    return usable
+
+
+def _products(X):
+    #X_i * X_j of every row for the upper triangle of X'X, computed once and reweighted at every Newton step
+    upper = np.triu_indices(X.shape[1])
+    return X[:, upper[0]] * X[:, upper[1]]
+
+
+def _gram(code, n_groups, products, weight, usable=None):
+    #X'WX of every group, accumulated over the rows; a left-out term gets a 1 on the diagonal, so its coefficient solves to 0
+    #terms * (terms + 1) / 2 products
+    n_terms = int(np.sqrt(2 * products.shape[1]))
+    upper = np.triu_indices(n_terms)
+    gram = np.empty((n_groups, n_terms, n_terms))
+    gram[:, upper[0], upper[1]] = gram[:, upper[1], upper[0]] = group_sums(code, n_groups, products * weight[:, None])
+    if usable is not None:
+        terms = np.arange(n_terms)
+        gram[:, terms, terms] += ~usable
+    return gram
+
+
+def _design(moves, by, features, target):
+    #rows of intercept and features with the terms left out of their group's model zeroed out, their products, and the target
+    #moves with a missing feature or target (no clock in the game) are left out, like statsmodels' missing='drop'
+    moves = moves[moves[features + [target]].notna().all(axis=1).to_numpy()]
+    keys, code = group_rows(moves, by)
+    X = np.column_stack([np.ones(len(moves)), moves[features].to_numpy(dtype=float)])
+    usable = independent_terms(_gram(code, len(keys), _products(X), np.ones(len(moves))))
+    X = X * usable[code]
+    return keys, code, X, _products(X), moves[target].to_numpy(dtype=float), usable
+
+
+def _predict(X, coef, code):
+    #every row's linear predictor, with its own group's coefficients
+    return np.einsum('nk,nk->n', X, coef[code])
+
+
+def _inverse(matrices):
+    try:
+        return np.linalg.inv(matrices)
+    except np.linalg.LinAlgError:
+        #collinear features in some group: least-squares inverse for all of them
+        return np.linalg.pinv(matrices, hermitian=True)
+
+
+def _p_value(stat):
+    #two-sided, normal approximation
+    return np.frompyfunc(math.erfc, 1, 1)(np.abs(stat) / math.sqrt(2)).astype(float)
+
+
+def _coef_table(keys, terms, model, target, coef, std_err, usable, fit):
+    #one row per group and term, the group's fit statistics repeated on each of its rows
+    n_terms = len(terms)
+    table = keys.loc[np.repeat(keys.index, n_terms)].reset_index(drop=True)
+    coef = np.where(usable, coef, np.nan)
+    std_err = np.where(usable, std_err, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stat = coef / std_err
+    table['Model'] = model
+    table['Target'] = target
+    table['Term'] = np.tile(terms, len(keys))
+    table['Coef'] = coef.ravel()
+    table['Std_err'] = std_err.ravel()
+    table['Stat'] = stat.ravel()
+    table['P_value'] = _p_value(stat.ravel())
+    for name, values in fit.items():
+        table[name] = np.repeat(values, n_terms)
+    return table
+
+
+def fit_ols(moves, by='Player', features=model_features, target='Winrate_delta_for_move'):
+    #one least-squares fit of target on the features per group of by (one fit overall when by is None)
+    moves, by = _prepare(moves, by, features)
+    keys, code, X, products, y, usable = _design(moves, by, list(features), target)
+    n_groups = len(keys)
+    n = np.bincount(code, minlength=n_groups).astype(float)
+    inverse = _inverse(_gram(code, n_groups, products, np.ones(len(y)), usable))
+    coef = np.einsum('gij,gj->gi', inverse, group_sums(code, n_groups, X * y[:, None]))
+
+    residual = y - _predict(X, coef, code)
+    rss = np.bincount(code, weights=residual * residual, minlength=n_groups)
+    dof = n - usable.sum(axis=1)
+    y_mean = np.bincount(code, weights=y, minlength=n_groups) / n
+    tss = np.bincount(code, weights=(y - y_mean[code]) ** 2, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma2 = rss / dof
+        r2 = 1 - rss / tss
+        fit = {'N': n.astype('int64'), 'R2': r2, 'Adj_R2': 1 - (1 - r2) * (n - 1) / dof, 'Sigma': np.sqrt(sigma2)}
+        std_err = np.sqrt(np.diagonal(inverse, axis1=1, axis2=2) * sigma2[:, None])
+    return _coef_table(keys, ['Intercept'] + list(features), 'ols', target, coef, std_err, usable, fit)
+
+
+def fit_logit(moves, by='Player', features=model_features, blunder_threshold=-0.15, max_iter=50, tol=1e-8):
+    #logistic regression of P(Winrate_delta_for_move < blunder_threshold) per group, by Newton's method (IRLS)
+    #all groups take their Newton steps together; a group that is not done after max_iter (separation) has Converged False
+    moves, by = _prepare(moves, by, features)
+    target = 'Winrate_delta_for_move'
+    keys, code, X, products, delta, usable = _design(moves, by, list(features), target)
+    n_groups = len(keys)
+    y = (delta < blunder_threshold).astype(float)
+    n = np.bincount(code, minlength=n_groups).astype(float)
+    positives = np.bincount(code, weights=y, minlength=n_groups)
+    coef = np.zeros((n_groups, X.shape[1]))
+    #a group stops taking steps once it has converged, and its rows are dropped from the next ones
+    active = np.ones(n_groups, dtype=bool)
+    iterations = np.zeros(n_groups, dtype='int64')
+    rows = (X, code, y, products)
+    while active.any() and iterations.max() < max_iter:
+        X_rows, code_rows, y_rows, products_rows = rows
+        p = 1 / (1 + np.exp(-np.clip(_predict(X_rows, coef, code_rows), -30, 30)))
+        gradient = group_sums(code_rows, n_groups, X_rows * (y_rows - p)[:, None])
+        gram = _gram(code_rows, n_groups, products_rows, p * (1 - p), usable)
+        #any invertible matrix for the groups that are done, their steps are zeroed
+        gram[~active] = np.eye(X.shape[1])
+        step = np.einsum('gij,gj->gi', _inverse(gram), gradient) * active[:, None]
+        coef += step
+        iterations += active
+        active &= np.abs(step).max(axis=1) > tol
+        still_active = active[code_rows]
+        if not still_active.all():
+            rows = tuple(values[still_active] for values in rows)
+
+    p = 1 / (1 + np.exp(-np.clip(_predict(X, coef, code), -30, 30)))
+    inverse = _inverse(_gram(code, n_groups, products, p * (1 - p), usable))
+    p = np.clip(p, 1e-12, 1 - 1e-12)
+    log_likelihood = np.bincount(code, weights=y * np.log(p) + (1 - y) * np.log(1 - p), minlength=n_groups)
+    #no pseudo R2 for a group without blunders, or with nothing else
+    rate = np.where((positives > 0) & (positives < n), positives / n, np.nan)
+    null_log_likelihood = n * (rate * np.log(rate) + (1 - rate) * np.log(1 - rate))
+    fit = {'N': n.astype('int64'), 'Positives': positives.astype('int64'), 'Log_likelihood': log_likelihood,
+           'Pseudo_R2': 1 - log_likelihood / null_log_likelihood, 'Converged': ~active, 'Iterations': iterations}
+    std_err = np.sqrt(np.diagonal(inverse, axis1=1, axis2=2))
+    target = '{} < {:g}'.format(target, blunder_threshold)
+    return _coef_table(keys, ['Intercept'] + list(features), 'logit', target, coef, std_err, usable, fit)
+
+
+def fit_models(moves, by='Player', features=model_features, blunder_threshold=-0.15):
+    #the OLS and logit tables of the same groups, one below the other
+    return pd.concat([fit_ols(moves, by, features), fit_logit(moves, by, features, blunder_threshold)], ignore_index=True)
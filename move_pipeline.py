@@ -0,0 +1,470 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Move-table stages
+#
+# Every stage takes the long move table built by pgn_reader.tokenize_movetext
+# (one row per ply, all games stacked, ordered by Game_num then Ply) and adds
+# columns to it with whole-column NumPy/pandas operations.
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from pgn_reader import tokenize_movetext
+from profiling import no_profiler
+
+
+# ### Clock
+
+time_control_period = re.compile(r'^(?:(\d+)/)?(\d+)(?:\+(\d+))?$')
+#the PGN standard's TimeControl for an unknown ('?') or untimed ('-') game
+unknown_time_controls = ('?', '-', '')
+
+
+def parse_time_control(time_control):
+    #'40/7200:20/3600:900+30' -> [(40, 7200, 0), (20, 3600, 0), (None, 900, 30)]
+    #each period is (moves in the period or None for the rest of the game, seconds added, increment)
+    #None for an unknown or untimed game
+    if pd.isna(time_control) or str(time_control).strip() in unknown_time_controls:
+        return None
+    periods = []
+    for part in str(time_control).strip().split(':'):
+        match = time_control_period.match(part)
+        if not match:
+            raise ValueError('unsupported time control: {!r}'.format(time_control))
+        moves, seconds, increment = match.groups()
+        periods.append((int(moves) if moves else None, int(seconds), int(increment or 0)))
+    return periods
+
+
+def known_time_controls(time_controls):
+    #TimeControl tags with the unknown/untimed markers as NaN, so fillna can put a default in their place
+    time_controls = pd.Series(time_controls)
+    return time_controls.where(~time_controls.astype('string').str.strip().isin(unknown_time_controls))
+
+
+def time_added_after_move(time_control, move_num):
+    #seconds put on the clock once move number move_num is completed:
+    #the next period's time when a period ends, plus the increment of the period now running
+    periods = parse_time_control(time_control)
+    period_moves = [moves for moves, _, _ in periods if moves is not None]
+    boundaries = np.cumsum(period_moves)
+    base = np.array([seconds for _, seconds, _ in periods] + [0])
+    increment = np.array([inc for _, _, inc in periods] + [periods[-1][2]])
+
+    move_num = np.asarray(move_num)
+    period_index = np.searchsorted(boundaries, move_num, side='right')
+    #only the last period may run without a move count
+    period_index = np.minimum(period_index, len(periods) - 1)
+    at_boundary = np.isin(move_num, boundaries)
+    return np.where(at_boundary, base[period_index], 0) + increment[period_index]
+
+
+clock_pattern = r'^\s*(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)\s*$'
+
+
+def clock_to_seconds(clock):
+    #'1:59:53' -> 7193, '4:05' -> 245, '0:00:07.4' -> 7; missing (or unreadable) clocks stay NaN
+    parts = pd.Series(clock).astype('string').str.extract(clock_pattern).astype(float)
+    seconds = parts[0].fillna(0) * 3600 + parts[1] * 60 + parts[2]
+    return np.rint(seconds.to_numpy(dtype=float))
+
+
+def seconds_to_clock(seconds):
+    #7193 -> '01:59:53', NaN -> None
+    seconds = np.asarray(seconds, dtype=float)
+    known = ~np.isnan(seconds)
+    whole = pd.Series(np.where(known, seconds, 0).astype(np.int64))
+    hours, rest = np.divmod(whole, 3600)
+    minutes, secs = np.divmod(rest, 60)
+    clock = (hours.astype(str).str.zfill(2) + ':' + minutes.astype(str).str.zfill(2) + ':' + secs.astype(str).str.zfill(2)).to_numpy(dtype=object)
+    clock[~known] = None
+    return clock
+
+
+def add_clock_columns(moves_df, time_controls, double_first_increment=False):
+    #time_controls: TimeControl string per game, indexed by Game_num
+    #double_first_increment: the clocks credit the increment twice before the first reading (the 2023 broadcast does)
+    #games without any [%clk], or with an unknown/untimed control, get NaN clocks and times
+    moves_df = moves_df.copy()
+    game_tc = pd.Series(time_controls).reindex(moves_df['Game_num']).to_numpy()
+    side = moves_df['Ply'].to_numpy() % 2
+    move_num = moves_df['Move_num'].to_numpy()
+
+    #starting clock and time added after every move, one parse per distinct time control
+    start_seconds = np.full(len(moves_df), np.nan)
+    time_added = np.zeros(len(moves_df))
+    for time_control in pd.unique(game_tc):
+        rows = pd.isna(game_tc) if pd.isna(time_control) else game_tc == time_control
+        periods = parse_time_control(time_control)
+        if periods is None:
+            continue
+        _, start, first_increment = periods[0]
+        start_seconds[rows] = start
+        time_added[rows] = time_added_after_move(time_control, move_num[rows])
+        if double_first_increment:
+            #25:17 after a 3 second first move at 1500+10
+            time_added[rows & (move_num == 1)] += first_increment
+
+    #a move without [%clk] keeps the clock its player had before it
+    by_side = [moves_df['Game_num'], side]
+    clock = pd.Series(clock_to_seconds(moves_df['Timestamp']), index=moves_df.index)
+    has_clock = clock.notna().groupby(moves_df['Game_num']).transform('any').to_numpy()
+    start_seconds[~has_clock] = np.nan
+    start = pd.Series(start_seconds, index=moves_df.index)
+    clock = clock.groupby(by_side).ffill().fillna(start)
+    clock_before = clock.groupby(by_side).shift(1).fillna(start)
+
+    clock = clock.to_numpy(dtype=float)
+    seconds_remaining = clock_before.to_numpy(dtype=float)
+    seconds_spent = seconds_remaining + time_added - clock
+
+    moves_df['Timestamp'] = seconds_to_clock(clock)
+    moves_df['Time_spent'] = seconds_to_clock(seconds_spent)
+    moves_df['Seconds_spent'] = seconds_spent
+    moves_df['Seconds_remaining'] = seconds_remaining
+    moves_df['Seconds_spent_by_opponent'] = moves_df.groupby('Game_num')['Seconds_spent'].shift(1, fill_value=0)
+    return moves_df
+
+
+# ### Evaluation
+
+verbose_eval_list = ['Black is Winning', 'Black is Clearly Better', 'Black is Slightly Better', 'Equal', 'White is Slightly Better', 'White is Clearly Better', 'White is Winning']
+
+
+def get_eval_for_pos(evaluation):
+    #gamestate from -3 (black is winning) to 3 (white is winning)
+    ranges = [1.5, 0.7, 0.26, -0.26, -0.7, -1.5]
+    gamestate = list(range(-3, 4))[::-1]
+    evaluation = np.asarray(evaluation, dtype=float)
+    result = np.select(
+        [evaluation > ranges[0], evaluation > ranges[1], evaluation > ranges[2], evaluation > ranges[3], evaluation > ranges[4], evaluation > ranges[5], evaluation <= ranges[5]],
+        gamestate,
+        default=0
+    )
+    return result
+
+
+def eval_to_numeric(evaluation):
+    #'0.35' -> 0.35, forced mates '#N'/'#-N' -> +-100 / (ln N + 0.1), missing stays NaN
+    evaluation = pd.Series(evaluation, dtype=object).astype(str)
+    numeric = pd.to_numeric(evaluation, errors='coerce').to_numpy(dtype=float, copy=True)
+    is_mate = evaluation.str.startswith('#').to_numpy()
+    mate_in = pd.to_numeric(evaluation[is_mate].str[1:], errors='coerce').to_numpy(dtype=float)
+    with np.errstate(divide='ignore'):
+        numeric[is_mate] = np.round(np.sign(mate_in) * 100 / (np.log(np.abs(mate_in)) + 0.1), 2)
+    return numeric
+
+
+def add_eval_columns(moves_df, opening_plies=4):
+    moves_df = moves_df.copy()
+    game_num = moves_df['Game_num']
+    numeric_eval = pd.Series(eval_to_numeric(moves_df['Evaluation']), index=moves_df.index)
+
+    #the first two moves of each side share the mean of their evaluations
+    opening = (moves_df['Ply'] < opening_plies).to_numpy()
+    #summed left to right and rounded with round() once per game, as the notebook always did
+    opening_plies_df = numeric_eval[opening].groupby([game_num[opening], moves_df['Ply'][opening]]).first().unstack()
+    opening_sum = opening_plies_df.iloc[:, 0].fillna(0)
+    for ply in opening_plies_df.columns[1:]:
+        opening_sum = opening_sum + opening_plies_df[ply].fillna(0)
+    game_mean = (opening_sum / opening_plies_df.count(axis=1)).map(lambda x: round(x, 2))
+    opening_mean = game_mean.reindex(game_num[opening]).set_axis(numeric_eval.index[opening])
+    numeric_eval[opening] = opening_mean
+    evaluation = moves_df['Evaluation'].astype(object)
+    evaluation[opening] = opening_mean.astype(str)
+    moves_df['Evaluation'] = evaluation
+
+    #a move without [%eval] leaves the engine's opinion where it was
+    numeric_eval = numeric_eval.groupby(game_num).ffill().fillna(0)
+
+    gamestate = get_eval_for_pos(numeric_eval.to_numpy())
+    moves_df['Gamestate'] = gamestate
+    moves_df['Verbose_eval'] = np.array(verbose_eval_list, dtype=object)[gamestate + 3]
+    moves_df['Change_gamestate'] = moves_df.groupby('Game_num')['Gamestate'].diff().fillna(0)
+
+    moves_df['Numeric_eval'] = numeric_eval
+    moves_df['Change_eval'] = numeric_eval.groupby(game_num).diff().fillna(0)
+    #positive centipawn loss is bad for the player who moved: white's moves are the even plies
+    side_sign = np.where(moves_df['Ply'].to_numpy() % 2 == 0, -1, 1)
+    moves_df['Centipawn_loss'] = (moves_df['Change_eval'].to_numpy() * 100 * side_sign).astype(int)
+    return moves_df
+
+
+# ### Expected game score
+
+exp_score_ranges = np.arange(-2.25, 2.26, 0.5)
+exp_score_steps = np.array([round(x, 1) for x in np.arange(0, 1.01, 0.1)])
+
+
+def get_exp_score_for_pos(evaluation, ranges=exp_score_ranges, exp_score=exp_score_steps):
+    #step table: 0.0 below -2.25, then +0.1 for every half pawn up to 1.0 above 2.25, each step including its upper edge
+    #the old per-move loop returned None exactly on -2.25 and for NaN, so both stay NaN
+    evaluation = np.asarray(evaluation, dtype=float)
+    exp = exp_score[np.searchsorted(ranges, evaluation, side='left')].astype(float)
+    exp[np.isnan(evaluation) | (evaluation == ranges[0])] = np.nan
+    return exp
+
+
+def get_logistic_exp_score_for_pos(evaluation, slope=0.8, center=0.0):
+    #smooth alternative to the step table; slope=0.8 gives the table's 0.2 points per pawn around 0.00
+    evaluation = np.asarray(evaluation, dtype=float)
+    return 1 / (1 + np.exp(-slope * (evaluation - center)))
+
+
+def add_exp_score_columns(moves_df, exp_score_for_pos=get_exp_score_for_pos):
+    moves_df = moves_df.copy()
+    moves_df['Expected_game_score'] = exp_score_for_pos(moves_df['Numeric_eval'].to_numpy())
+    moves_df['Change_game_score'] = moves_df.groupby('Game_num')['Expected_game_score'].diff().fillna(0)
+    #from the point of view of the player who moved: black's moves are the odd plies
+    side_sign = np.where(moves_df['Ply'].to_numpy() % 2 == 1, -1, 1)
+    moves_df['Winrate_delta_for_move'] = moves_df['Change_game_score'].to_numpy() * side_sign
+    return moves_df
+
+
+# ### Move classification
+
+move_label_list = ['Brilliant', 'Excellent', 'Good', 'Inaccuracy', 'Mistake', 'Blunder']
+
+#(centipawn comparison, centipawn threshold, comparison on abs(Change_gamestate), threshold, Move_label)
+#every move starts as 'Good' (3) and later rules win, so the list can be edited (or read with pd.read_csv) like the notebook cell
+move_label_rules = [
+    ('>', 50, '>', 0, 4),
+    ('>', 75, '>', 1, 5),
+    ('>', 100, '>', 0, 5),
+    ('>', 150, '>', 2, 6),
+    ('>', 250, '>', 1, 6),
+    ('<', 25, '==', 0, 2),
+    ('<', -70, '>', 0, 1),
+]
+
+comparisons = {'>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal, '==': np.equal}
+
+
+def classify_moves(centipawn_loss, change_gamestate, rules=move_label_rules, default=3):
+    if isinstance(rules, pd.DataFrame):
+        rules = list(rules.itertuples(index=False, name=None))
+    centipawn_loss = np.asarray(centipawn_loss)
+    gamestate_change = np.abs(np.asarray(change_gamestate))
+    conditions = [comparisons[cp_op](centipawn_loss, cp_threshold) & comparisons[gs_op](gamestate_change, gs_threshold)
+                  for cp_op, cp_threshold, gs_op, gs_threshold, _ in rules]
+    labels = [label for *_, label in rules]
+    #np.select keeps the first match, the rule table keeps the last one
+    return np.select(conditions[::-1], labels[::-1], default=default)
+
+
+def add_move_label_columns(moves_df, rules=move_label_rules):
+    moves_df = moves_df.copy()
+    moves_df['Move_label'] = classify_moves(moves_df['Centipawn_loss'], moves_df['Change_gamestate'], rules)
+    moves_df['Verbose_label'] = pd.Categorical.from_codes(moves_df['Move_label'] - 1, categories=move_label_list)
+    return moves_df
+
+
+# ### Fake brilliancies
+
+brilliancy_eval_cols = ['Evaluation', 'Gamestate', 'Verbose_eval', 'Numeric_eval', 'Centipawn_loss', 'Expected_game_score', 'Winrate_delta_for_move']
+brilliancy_change_cols = {'Change_gamestate': 0, 'Change_eval': 0, 'Change_game_score': 0, 'Move_label': 2, 'Verbose_label': 'Excellent'}
+
+
+def fix_fake_brilliancies(moves_df):
+    #two brilliant moves in a row means the engine overreacted to the first one:
+    #that move gets the evaluation of the position before it and becomes 'Excellent'
+    #returns the corrected table and one audit row per corrected move
+    moves_df = moves_df.copy()
+    game_num = moves_df['Game_num'].to_numpy()
+    brilliant = (moves_df['Verbose_label'] == 'Brilliant').to_numpy()
+    next_brilliant = np.append(brilliant[1:] & (game_num[1:] == game_num[:-1]), False)
+    fake = brilliant & next_brilliant & (moves_df['Ply'].to_numpy() > 0)
+
+    #evaluation comes from the last move before it that is not corrected itself (runs of brilliancies chain back)
+    rows = np.arange(len(moves_df))
+    last_kept = np.maximum.accumulate(np.where(fake, -1, rows))
+    fake_rows = rows[fake]
+    source_rows = last_kept[fake_rows - 1]
+
+    audit = moves_df.iloc[fake_rows][['Game_num', 'Move_num', 'Move', 'Numeric_eval']].reset_index(drop=True)
+    for col in brilliancy_eval_cols:
+        values = moves_df[col].to_numpy(copy=True)
+        values[fake_rows] = values[source_rows]
+        moves_df[col] = values
+    for col, value in brilliancy_change_cols.items():
+        moves_df.loc[fake, col] = value
+    audit['Corrected_eval'] = moves_df['Numeric_eval'].to_numpy()[fake_rows]
+    return moves_df, audit
+
+
+# ### Opening prep and time trouble
+#
+# A prep heuristic returns, for every move, whether that move shows the player has left
+# their preparation. A player stays out of prep for the rest of the game once it happens.
+
+def game_start_seconds(moves_df):
+    #the first clock reading of each game, broadcast to all of its moves
+    first_moves = moves_df[moves_df['Ply'] == 0]
+    start = pd.Series(clock_to_seconds(first_moves['Timestamp']), index=first_moves['Game_num'].to_numpy())
+    return start.reindex(moves_df['Game_num']).to_numpy()
+
+
+def prep_by_recall_time(moves_df, reasonable_recall_percentage=0.04):
+    #a think longer than 4% of the starting clock cannot be recalling home analysis
+    return moves_df['Seconds_spent'].to_numpy() > game_start_seconds(moves_df) * reasonable_recall_percentage
+
+
+def prep_by_move_count(moves_df, prep_moves=15):
+    return moves_df['Move_num'].to_numpy() > prep_moves
+
+
+def prep_by_opening_book(moves_df, book_lines):
+    #book_lines: known lines as space separated SAN, e.g. 'e4 e5 Nf3 Nc6 Bb5' (from an ECO table or a repertoire)
+    #a move is out of book once the game's moves so far are no longer a prefix of any line
+    book_lines = [line.split() for line in book_lines]
+    book_depth = max((len(line) for line in book_lines), default=0)
+    book_prefixes = {' '.join(line[:k]) for line in book_lines for k in range(1, len(line) + 1)}
+
+    in_depth = (moves_df['Ply'] < book_depth).to_numpy()
+    if not in_depth.any():
+        return np.ones(len(moves_df), dtype=bool)
+    opening_moves = moves_df[in_depth].pivot(index='Game_num', columns='Ply', values='Move').astype(object)
+    #one column per ply, each holding the line played so far in every game
+    line_so_far = opening_moves.iloc[:, 0]
+    in_book_table = np.zeros(opening_moves.shape, dtype=bool)
+    for k in range(opening_moves.shape[1]):
+        if k > 0:
+            line_so_far = line_so_far + ' ' + opening_moves.iloc[:, k]
+        in_book_table[:, k] = line_so_far.isin(book_prefixes).to_numpy()
+
+    in_book = np.zeros(len(moves_df), dtype=bool)
+    game_rows = opening_moves.index.get_indexer(moves_df['Game_num'][in_depth])
+    in_book[in_depth] = in_book_table[game_rows, moves_df['Ply'][in_depth].to_numpy()]
+    return ~in_book
+
+
+def add_prep_columns(moves_df, prep_heuristic=prep_by_recall_time, time_trouble_percentage=0.1):
+    #prep_heuristic: any of the prep_by_* functions (use functools.partial to change their parameters)
+    moves_df = moves_df.copy()
+    moves_df['In_time_trouble'] = moves_df['Seconds_remaining'].to_numpy() < game_start_seconds(moves_df) * time_trouble_percentage
+
+    left_prep = pd.Series(np.asarray(prep_heuristic(moves_df), dtype=bool), index=moves_df.index)
+    side = moves_df['Ply'] % 2
+    moves_df['In_prep'] = ~left_prep.groupby([moves_df['Game_num'], side]).cummax()
+    return moves_df
+
+
+# ### Players
+
+def normalize_player_name(names):
+    #broadcasts are not consistent: 'Ian Nepomniachtchi' and 'Nepomniachtchi, Ian' are the same player
+    return pd.Series(names).str.strip().str.replace(r'^([^,]+?)\s+([^,\s]+)$', r'\2, \1', regex=True)
+
+
+def add_player_columns(moves_df, games_df):
+    #Player, Color and Opponent of every move, from the White/Black tags of its game (games_df indexed by Game_num)
+    moves_df = moves_df.copy()
+    white = normalize_player_name(games_df['White']).reindex(moves_df['Game_num']).to_numpy()
+    black = normalize_player_name(games_df['Black']).reindex(moves_df['Game_num']).to_numpy()
+    white_to_move = moves_df['Ply'].to_numpy() % 2 == 0
+    moves_df['Player'] = np.where(white_to_move, white, black)
+    moves_df['Color'] = pd.Categorical(np.where(white_to_move, 'White', 'Black'), categories=['White', 'Black'])
+    moves_df['Opponent'] = np.where(white_to_move, black, white)
+    return moves_df
+
+
+def player_move_store(moves_df, games_df):
+    #long move table indexed by player: store.loc[name] is every move that player made, in game order
+    store = add_player_columns(moves_df, games_df)
+    return store.set_index('Player').sort_index(kind='stable')
+
+
+def split_moves_by_player(moves_df, games_df):
+    #player name -> that player's moves
+    store = add_player_columns(moves_df, games_df)
+    return {name: df for name, df in store.groupby('Player', sort=False)}
+
+
+def update_player_moves(player_moves, new_moves, new_games):
+    #adds newly ingested games to the per-player tables, one concat per player rather than per game
+    for name, df in split_moves_by_player(new_moves, new_games).items():
+        player_moves[name] = pd.concat([player_moves[name], df]) if name in player_moves else df
+    return player_moves
+
+
+# ### Compact schema
+
+#narrow numbers and categoricals for the repeated strings (moves, evaluations, clocks, labels);
+#Timestamp/Time_spent stay 'HH:MM:SS' values, only stored once per distinct clock
+compact_schema = {
+    'Game_num': 'int32', 'Ply': 'int16', 'Move_num': 'int16', 'Move': 'category',
+    'Evaluation': 'category', 'Timestamp': 'category', 'Time_spent': 'category',
+    'Seconds_spent': 'float32', 'Seconds_remaining': 'float32', 'Seconds_spent_by_opponent': 'float32',
+    'Gamestate': 'int8', 'Verbose_eval': pd.CategoricalDtype(verbose_eval_list), 'Change_gamestate': 'int8',
+    'Numeric_eval': 'float32', 'Change_eval': 'float32', 'Centipawn_loss': 'int32',
+    'In_time_trouble': 'bool', 'In_prep': 'bool', 'Move_label': 'int8', 'Verbose_label': pd.CategoricalDtype(move_label_list),
+    'Expected_game_score': 'float32', 'Change_game_score': 'float32', 'Winrate_delta_for_move': 'float32',
+    'Player': 'category', 'Opponent': 'category',
+}
+
+#bit of each boolean column in the packed Flags byte
+flag_bits = {'In_prep': 1, 'In_time_trouble': 2}
+
+
+def pack_flags(moves_df, flags=flag_bits):
+    packed = np.zeros(len(moves_df), dtype=np.uint8)
+    for col, bit in flags.items():
+        packed |= np.where(moves_df[col].to_numpy(dtype=bool), bit, 0).astype(np.uint8)
+    return moves_df.drop(columns=list(flags)).assign(Flags=packed)
+
+
+def unpack_flags(moves_df, flags=flag_bits):
+    packed = moves_df['Flags'].to_numpy()
+    return moves_df.drop(columns='Flags').assign(**{col: packed & bit != 0 for col, bit in flags.items()})
+
+
+def compact_move_table(moves_df, schema=compact_schema, packed_flags=False):
+    #columns missing from the schema keep their dtype; values that do not fit a narrow type raise instead of wrapping
+    dtypes = {col: dtype for col, dtype in schema.items() if col in moves_df.columns}
+    for col, dtype in dtypes.items():
+        if isinstance(dtype, str) and dtype.startswith('int') and len(moves_df):
+            info = np.iinfo(dtype)
+            if moves_df[col].min() < info.min or moves_df[col].max() > info.max:
+                raise ValueError('{} does not fit in {}'.format(col, dtype))
+    moves_df = moves_df.astype(dtypes)
+    return pack_flags(moves_df) if packed_flags else moves_df
+
+
+def memory_report(before, after):
+    #bytes per move of every column, and in total, for two versions of the same move table
+    report = pd.DataFrame({'before': before.memory_usage(deep=True, index=False) / max(len(before), 1),
+                           'after': after.memory_usage(deep=True, index=False) / max(len(after), 1)})
+    report.loc['Total'] = report.sum()
+    report['saved'] = 1 - report['after'] / report['before']
+    return report.round(2)
+
+
+# ### Whole pipeline
+
+#the notebook's 2021 file has no TimeControl tag; both matches were played at this control
+default_time_control = '40/7200:20/3600:900+30'
+
+
+def process_games(games_df, time_control=default_time_control, opening_plies=4, prep_heuristic=prep_by_recall_time,
+                  time_trouble_percentage=0.1, rules=move_label_rules, exp_score_for_pos=get_exp_score_for_pos, compact=False,
+                  reevaluate=None, double_first_increment=False, profiler=no_profiler):
+    #games_df (from pgn_reader) -> finished move table, every stage of the notebook in order
+    #compact=True converts the result to compact_schema; pass a profiling.StageProfiler to time the stages
+    #reevaluate(moves_df, games_df) replaces the [%eval] scores before they are used (engine_eval.reevaluate_moves)
+    games_df = games_df.reset_index(drop=True)
+    moves_df = profiler.run('tokenize', tokenize_movetext, games_df['raw_pgn'])
+    if reevaluate is not None:
+        moves_df = profiler.run('reevaluate', reevaluate, moves_df, games_df)
+    time_controls = known_time_controls(games_df['TimeControl']).fillna(time_control)
+    moves_df = profiler.run('clock', add_clock_columns, moves_df, time_controls, double_first_increment)
+    moves_df = profiler.run('eval', add_eval_columns, moves_df, opening_plies)
+    moves_df = profiler.run('prep', add_prep_columns, moves_df, prep_heuristic, time_trouble_percentage)
+    moves_df = profiler.run('label', add_move_label_columns, moves_df, rules)
+    moves_df = profiler.run('exp_score', add_exp_score_columns, moves_df, exp_score_for_pos)
+    moves_df, _ = profiler.run('fake_brilliancies', fix_fake_brilliancies, moves_df)
+    if compact:
+        moves_df = profiler.run('compact', compact_move_table, moves_df)
+    return moves_df
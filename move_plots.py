@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Figures of the notebook as functions
+#
+# Every function builds and returns a matplotlib Figure without showing it, so the
+# same code serves the notebook (plt.show()) and headless batch rendering
+# (fig.savefig() on the Agg backend). This is the only module that imports
+# matplotlib and seaborn; the processing modules never do.
+
+import itertools
+
+import matplotlib.patches as mpatches
+import matplotlib.gridspec as gridspec
+import matplotlib.pyplot as plt
+from matplotlib.colors import ListedColormap
+import numpy as np
+import seaborn as sns
+
+from move_pipeline import move_label_list, normalize_player_name
+from figure_layout import grid_pages, player_color_map, player_colors
+
+
+#colors of Excellent, Good, Inaccuracy, Mistake and Blunder
+label_palette = ['#95BC4A', '#96AF8B', '#F5BF45', '#E58E2A', '#CA3431']
+player_markers = ['P', 'o', '*', 's', 'D', 'X', '^', 'v']
+
+
+def chessboard_figure(sns_data, title='No Prep', squares=(8, 8), xlim=(0, 400), ylim=(0, 4000), square_colors=('#B58863', '#F0D9B5')):
+    #sns_data: color (move label), x (seconds spent), y (seconds remaining), size (moves) and shape (player)
+    #squares: (columns, rows) of the board drawn behind the points, bottom-left square dark
+    fig, ax = plt.subplots(figsize=(8, 8))
+    x_edges = np.linspace(xlim[0], xlim[1], squares[0] + 1)
+    y_edges = np.linspace(ylim[0], ylim[1], squares[1] + 1)
+    ax.xaxis.set_major_locator(plt.MultipleLocator(x_edges[1] - x_edges[0]))
+    ax.yaxis.set_major_locator(plt.MultipleLocator(y_edges[1] - y_edges[0]))
+
+    #the whole board is one QuadMesh
+    board = np.add.outer(np.arange(squares[1]), np.arange(squares[0])) % 2
+    ax.pcolormesh(x_edges, y_edges, board, cmap=ListedColormap(square_colors), vmin=0, vmax=1)
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+
+    #labels keep their colors even when a player never made one of them
+    hue_order = [label for label in move_label_list if label in set(sns_data['color'])]
+    palette = dict(zip(move_label_list[1:], label_palette))
+    sns.scatterplot(data=sns_data, x='x', y='y', size='size', style='shape', hue='color', hue_order=hue_order, sizes=(50, 2000), legend=False,
+                    markers=player_markers[:sns_data['shape'].nunique()], palette=palette, ax=ax)
+
+    ax.set_xlabel('Seconds Spent on Move')
+    ax.set_ylabel('Seconds Remaining After Move')
+    ax.set_title('Relationship Between Move Time v.s. Time left Given Move Quality ({})'.format(title))
+
+    legend_handles = [ax.scatter([], [], color=palette[label], label=label) for label in hue_order]
+    ax.legend(handles=legend_handles, loc='lower right')
+    return fig
+
+
+def draw_game(ax, moves, white='White', black='Black', colors=('#4575b4', '#d73027'), title=None):
+    #seconds spent against the change of expected score, one color per side; white's moves are the even plies
+    white_moves = moves['Ply'].to_numpy() % 2 == 0
+    delta = moves['Winrate_delta_for_move'].to_numpy()
+    seconds_spent = moves['Seconds_spent'].to_numpy()
+    ax.scatter(delta[white_moves] - 0.005, seconds_spent[white_moves], color=colors[0], label='White ({})'.format(white), s=10)
+    ax.scatter(delta[~white_moves] + 0.005, seconds_spent[~white_moves], color=colors[1], label='Black ({})'.format(black), s=10)
+    ax.set_xlabel('Expected Game Score Affected')
+    ax.set_ylabel('Seconds spent')
+    if title:
+        ax.set_title(title)
+    ax.legend(loc='upper right', fontsize='small')
+    ax.set_xlim(-1.0, 0.5)
+
+
+def game_figure(moves, white='White', black='Black', title=None):
+    #one game; moves need Ply, Winrate_delta_for_move and Seconds_spent
+    fig, ax = plt.subplots(figsize=(8, 4))
+    draw_game(ax, moves, white, black, title=title)
+    fig.tight_layout()
+    return fig
+
+
+def game_grid_figure(moves, games, ncols, nrows, colors=None, first_number=1):
+    #one page of small multiples; games (White, Black, indexed by Game_num) in the order they are drawn,
+    #moves of those games with Game_num, Ply, Winrate_delta_for_move and Seconds_spent
+    colors = colors or player_color_map(games)
+    fig, axs = plt.subplots(nrows, ncols, figsize=(20, 10 * nrows / 6), squeeze=False)
+    axs = axs.flatten()
+    by_game = dict(list(moves.groupby('Game_num', sort=False)))
+    white = normalize_player_name(games['White']).to_numpy()
+    black = normalize_player_name(games['Black']).to_numpy()
+    for i, game_num in enumerate(games.index):
+        draw_game(axs[i], by_game[game_num], white[i], black[i], colors=(colors[white[i]], colors[black[i]]), title='Game {}'.format(first_number + i))
+    for ax in axs[len(games):]:
+        ax.set_visible(False)
+    fig.tight_layout()
+    return fig
+
+
+def iter_game_grid_figures(moves_df, games, max_rows=6, max_cols=3, colors=None):
+    #one figure per page of games, made only when the caller asks for it, so a long event never holds all its pages at once
+    colors = colors or player_color_map(games)
+    game_num = moves_df['Game_num'].to_numpy()
+    for page_games, ncols, nrows, first_number in grid_pages(games, max_rows, max_cols):
+        page_moves = moves_df[np.isin(game_num, page_games.index.to_numpy())]
+        yield game_grid_figure(page_moves, page_games, ncols, nrows, colors, first_number)
+
+
+def _curt(x):
+    return x ** (1 / 3)
+
+
+def _curt_inv(x):
+    return np.power(x, 3)
+
+
+def move_time_figure(players, colors=None):
+    #players: (name, moves) pairs; moves need Seconds_spent, Seconds_remaining and Move_label
+    #colors: {name: (colormap, legend color)}; other players take player_colors in turn, starting over after the last
+    #the larger and darker the point, the worse the move; the histograms are of the first player's moves
+    fig = plt.figure(figsize=(10, 10))
+    gspec = gridspec.GridSpec(7, 7)
+
+    scatter_ax = fig.add_subplot(gspec[1:, 1:])
+    top_hist = fig.add_subplot(gspec[0, 1:], sharex=scatter_ax)
+    side_hist = fig.add_subplot(gspec[1:, 0], sharey=scatter_ax)
+
+    colors = colors or {}
+    palette = itertools.cycle(player_colors)
+    legend_patches = []
+    for name, moves in players:
+        cmap, color = colors[name] if name in colors else next(palette)
+        #float first: under the compact schema Move_label is int8, where 6 ** 3 wraps around
+        severity = moves['Move_label'].to_numpy(dtype=float) ** 3
+        scatter_ax.scatter(moves['Seconds_spent'], moves['Seconds_remaining'], c=severity, cmap=cmap, alpha=0.7, label=name, s=severity)
+        legend_patches.append(mpatches.Patch(color=color, label=name))
+    scatter_ax.set_xlabel('Seconds Spent')
+    scatter_ax.set_ylabel('Seconds Remaining')
+    scatter_ax.set_title("The Larger/Darker the Point, the Worse the Move")
+
+    vertical_lines = [60, 120, 300, 600, 1200]
+    vertical_annotations = ['1 min', '2 min', '5 min', '10 min', '20 min']
+    for line, annotation in zip(vertical_lines, vertical_annotations):
+        scatter_ax.axvline(line, color='green', linestyle='--', linewidth=0.5)
+        scatter_ax.annotate(annotation, xy=(line, 0), xycoords='data', xytext=(18, 8), textcoords='offset points',
+                            ha='center', va='center', color='green')
+
+    horizontal_lines = [60, 300, 900, 1800, 3600]
+    horizontal_annotations = ['1 min', '5 min', '15 min', '30 min', '1 hour']
+    for line, annotation in zip(horizontal_lines, horizontal_annotations):
+        scatter_ax.axhline(line, color='green', linestyle='--', linewidth=0.5)
+        scatter_ax.annotate(annotation, xy=(0, line), xycoords='data', xytext=(5, 5), textcoords='offset points',
+                            ha='left', va='center', color='green')
+
+    scatter_ax.set_yscale('function', functions=(_curt, _curt_inv))
+    scatter_ax.set_xscale('function', functions=(_curt, _curt_inv))
+    scatter_ax.legend(handles=legend_patches)
+
+    y_bins = [x ** 3 for x in np.arange(0.5, 20, 0.5)]
+    x_bins = [x ** 3 for x in np.arange(0.5, 14, 0.5)]
+    first_moves = players[0][1]
+    top_hist.hist(first_moves['Seconds_spent'], bins=x_bins, color='gray', alpha=0.7)
+    side_hist.hist(first_moves['Seconds_remaining'], bins=y_bins, orientation='horizontal', color='gray', alpha=0.7)
+    side_hist.invert_xaxis()
+    top_hist.tick_params(axis='x', which='both', bottom=False, top=False, labelbottom=False)
+    side_hist.tick_params(axis='y', which='both', left=False, right=False, labelleft=False)
+
+    for ax in [top_hist, scatter_ax]:
+        ax.set_xlim(0, 2500)
+    for ax in [side_hist, scatter_ax]:
+        ax.set_ylim(0, 7000)
+    fig.tight_layout()
+    return fig
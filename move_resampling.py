@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Bootstrap confidence intervals and permutation tests, resampled by game
+#
+# Moves of one game are not independent, so whole games are resampled. Every
+# statistic here is a function of per-game sums: move counts and the counts and
+# sums of a measure for the summary tables (move_summary.time_quality_summary),
+# X'X and X'y for the OLS coefficients (move_models.fit_ols). A resample is then a
+# weight per game. The bootstrap draws an index matrix of games for a chunk of
+# resamples and counts it into multinomial weights; the permutation test flips,
+# game by game, which of the two players the game's moves count for. Either way
+# the resampled sums of a whole chunk are one matrix product. Chunks bound the
+# memory and run in a process pool, and each chunk gets its own seed from one
+# SeedSequence, so the results depend on the seed, never on the number of
+# workers. Medians are not sums, so the summary statistics resampled are the move
+# counts and means.
+#
+#   summary_bootstrap(move_features.view(prep=False, drop=False), n_resamples=10000)
+#   summary_permutation_test(moves, 'Liren, Ding', 'Nepomniachtchi, Ian')
+#   coefficient_bootstrap(moves, by='Player')
+
+import functools
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from move_features import add_feature_columns
+from move_models import independent_terms, model_features
+from move_summary import summary_measures
+
+
+def _moves_frame(moves, features=()):
+    #Player and Game_num back to columns (player store, MoveFeatures views), feature columns added when missing
+    if {'Player', 'Game_num'} & set(moves.index.names):
+        moves = moves.reset_index()
+    if any(feature not in moves.columns for feature in features):
+        moves = add_feature_columns(moves)
+    return moves
+
+
+def _group_codes(moves, by):
+    #group of every move and the keys of the groups, in sorted order
+    if not by:
+        return np.zeros(len(moves), dtype='int64'), pd.DataFrame(index=[0])
+    grouped = moves.groupby(list(by), observed=True, sort=True)
+    return grouped.ngroup().to_numpy(), grouped.size().index.to_frame(index=False)
+
+
+def game_sums(game_code, group_code, values, n_games, n_groups):
+    #(games, groups, columns) sums of the rows of values
+    flat = game_code * n_groups + group_code
+    sums = np.empty((n_games * n_groups, values.shape[1]))
+    for column in range(values.shape[1]):
+        sums[:, column] = np.bincount(flat, weights=values[:, column], minlength=n_games * n_groups)
+    return sums.reshape(n_games, n_groups, values.shape[1])
+
+
+# ### Statistics of summed columns
+# (resamples, groups, columns) sums -> (resamples, groups, statistics)
+
+def _counts_and_means(totals):
+    #column 0 is the move count, then every measure's count of known values and its sum
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.concatenate([totals[..., :1], totals[..., 2::2] / totals[..., 1::2]], axis=-1)
+
+
+def _summary_values(moves, measures):
+    #a missing measure (no clock in the game) counts for the move count only
+    columns = [np.ones(len(moves))]
+    for measure in measures:
+        values = moves[measure].to_numpy(dtype=float)
+        known = ~np.isnan(values)
+        columns += [known.astype(float), np.where(known, values, 0)]
+    return np.column_stack(columns)
+
+
+def _ols_coefficients(totals, usable):
+    #columns: X'X flattened, then X'y; usable: (groups, terms) mask of the terms in each group's model
+    n_terms = usable.shape[1]
+    gram = totals[..., :n_terms * n_terms].reshape(totals.shape[:-1] + (n_terms, n_terms))
+    xty = totals[..., n_terms * n_terms:] * usable
+    gram = np.where(usable[:, :, None] & usable[:, None, :], gram, np.eye(n_terms))
+    try:
+        coef = np.linalg.solve(gram, xty[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        #a resample without enough variation in some group: that group's coefficients are NaN in it
+        coef = np.full(xty.shape, np.nan)
+        full_rank = np.linalg.matrix_rank(gram, hermitian=True) == n_terms
+        coef[full_rank] = np.linalg.solve(gram[full_rank], xty[full_rank][..., None])[..., 0]
+    return np.where(usable, coef, np.nan)
+
+
+def _ols_values(moves, features, target):
+    X = np.column_stack([np.ones(len(moves))] + [moves[feature].to_numpy(dtype=float) for feature in features])
+    y = moves[target].to_numpy(dtype=float)
+    #moves with a missing feature or target are left out, as in move_models.fit_ols
+    complete = ~np.isnan(X).any(axis=1) & ~np.isnan(y)
+    X = np.where(complete[:, None], X, 0)
+    y = np.where(complete, y, 0)
+    return np.column_stack([(X[:, :, None] * X[:, None, :]).reshape(len(moves), -1), X * y[:, None]])
+
+
+# ### Resampling engine
+
+#the per-game sums and the statistic of the resamples, set once per worker process
+_shared = {}
+
+
+def _init_worker(sums, statistic):
+    _shared['sums'] = sums
+    _shared['statistic'] = statistic
+
+
+def _bootstrap_chunk(seed, size):
+    #games drawn with replacement, as a (resamples, games) index matrix counted into weights
+    sums, statistic = _shared['sums'], _shared['statistic']
+    n_games = len(sums)
+    games = np.random.default_rng(seed).integers(0, n_games, size=(size, n_games))
+    weights = np.bincount((games + n_games * np.arange(size)[:, None]).ravel(), minlength=size * n_games)
+    return statistic(np.tensordot(weights.reshape(size, n_games).astype(float), sums, axes=1))
+
+
+def _flip_chunk(seed, size):
+    #sums: (games, 2, groups, columns); every game's two sides swap places with probability 1/2
+    sums, statistic = _shared['sums'], _shared['statistic']
+    flips = np.random.default_rng(seed).random((size, len(sums))) < 0.5
+    moved = np.tensordot(flips.astype(float), sums[:, 1] - sums[:, 0], axes=1)
+    total = sums.sum(axis=0)
+    n_groups = sums.shape[2]
+    stats = statistic(np.concatenate([total[0] + moved, total[1] - moved], axis=1))
+    return stats[:, :n_groups] - stats[:, n_groups:]
+
+
+def resample(chunk_function, sums, statistic, n_resamples=10000, seed=0, chunk_size=500, workers=None):
+    #(n_resamples, groups, statistics) array of the statistic of every resample
+    sizes = [min(chunk_size, n_resamples - start) for start in range(0, n_resamples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(sizes) <= 1:
+        _init_worker(sums, statistic)
+        try:
+            results = [chunk_function(chunk_seed, size) for chunk_seed, size in zip(seeds, sizes)]
+        finally:
+            _shared.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(sums, statistic)) as executor:
+            results = list(executor.map(chunk_function, seeds, sizes))
+    return np.concatenate(results)
+
+
+def _long_table(keys, names, columns):
+    #one row per group and statistic; columns: name -> (groups, statistics) array
+    table = keys.loc[np.repeat(keys.index, len(names))].reset_index(drop=True)
+    table['Statistic'] = np.tile(names, len(keys))
+    for name, values in columns.items():
+        table[name] = np.asarray(values).ravel()
+    return table
+
+
+def _interval_table(keys, names, estimate, replicates, confidence):
+    alpha = (1 - confidence) / 2
+    with warnings.catch_warnings():
+        #statistics that are NaN in every resample (a term left out of the model)
+        warnings.simplefilter('ignore', RuntimeWarning)
+        low, high = np.nanquantile(replicates, [alpha, 1 - alpha], axis=0)
+        std_err = np.nanstd(replicates, axis=0, ddof=1)
+    return _long_table(keys, names, {'Estimate': estimate, 'Std_err': std_err, 'CI_low': low, 'CI_high': high,
+                                     'Resamples': (~np.isnan(replicates)).sum(axis=0)})
+
+
+def _p_values(observed, permuted, alternative):
+    #permutation p-values with the observed statistic counted as one of the permutations
+    if alternative == 'two-sided':
+        extreme = np.abs(permuted) >= np.abs(observed)
+    elif alternative == 'greater':
+        extreme = permuted >= observed
+    elif alternative == 'less':
+        extreme = permuted <= observed
+    else:
+        raise ValueError('alternative must be two-sided, greater or less, not {}'.format(alternative))
+    valid = ~np.isnan(permuted)
+    p_value = (1 + (extreme & valid).sum(axis=0)) / (1 + valid.sum(axis=0))
+    return np.where(np.isnan(observed), np.nan, p_value), valid.sum(axis=0)
+
+
+def _two_player_sums(moves, player_a, player_b, by, values):
+    #(games, 2, groups, columns) sums of the two players' moves, groups of by shared between them
+    moves = moves[moves['Player'].isin([player_a, player_b])]
+    group_code, keys = _group_codes(moves, by)
+    game_code, games = pd.factorize(moves['Game_num'], sort=True)
+    side = (moves['Player'] == player_b).to_numpy().astype('int64')
+    sums = game_sums(game_code, side * len(keys) + group_code, values(moves), len(games), 2 * len(keys))
+    return keys, sums.reshape(len(games), 2, len(keys), -1)
+
+
+def _permutation_table(players, keys, names, sums, statistic, alternative, **resample_args):
+    n_games, _, n_groups, n_columns = sums.shape
+    estimate_a, estimate_b = statistic(sums.sum(axis=0).reshape(1, 2 * n_groups, n_columns))[0].reshape(2, n_groups, -1)
+    observed = estimate_a - estimate_b
+    permuted = resample(_flip_chunk, sums, statistic, **resample_args)
+    p_value, valid = _p_values(observed, permuted, alternative)
+    table = _long_table(keys, names, {'Estimate_a': estimate_a, 'Estimate_b': estimate_b, 'Difference': observed,
+                                      'P_value': p_value, 'Resamples': valid})
+    table.insert(0, 'Player_b', players[1])
+    table.insert(0, 'Player_a', players[0])
+    return table
+
+
+# ### Summary statistics
+
+def summary_bootstrap(moves, by=('Player', 'Verbose_label'), measures=summary_measures, n_resamples=10000, confidence=0.95,
+                      seed=0, chunk_size=500, workers=None):
+    #percentile intervals of the move count and the means of the measures per group, games resampled with replacement
+    #one row per group and statistic (Moves, <measure>_mean)
+    moves = _moves_frame(moves)
+    group_code, keys = _group_codes(moves, by)
+    game_code, games = pd.factorize(moves['Game_num'], sort=True)
+    sums = game_sums(game_code, group_code, _summary_values(moves, measures), len(games), len(keys))
+    estimate = _counts_and_means(sums.sum(axis=0)[None])[0]
+    replicates = resample(_bootstrap_chunk, sums, _counts_and_means, n_resamples, seed, chunk_size, workers)
+    names = ['Moves'] + [measure + '_mean' for measure in measures]
+    return _interval_table(keys, names, estimate, replicates, confidence)
+
+
+def summary_permutation_test(moves, player_a, player_b, by=('Verbose_label',), measures=summary_measures, n_resamples=10000,
+                             alternative='two-sided', seed=0, chunk_size=500, workers=None):
+    #does player_a's move count or mean of a measure differ from player_b's, per group of by?
+    #under the null the two players are exchangeable game by game, so each permutation swaps the players' moves
+    #within a random half of the games (a game only one of them played moves to the other one)
+    moves = _moves_frame(moves)
+    keys, sums = _two_player_sums(moves, player_a, player_b, by, functools.partial(_summary_values, measures=measures))
+    names = ['Moves'] + [measure + '_mean' for measure in measures]
+    return _permutation_table((player_a, player_b), keys, names, sums, _counts_and_means, alternative, n_resamples=n_resamples, seed=seed,
+                              chunk_size=chunk_size, workers=workers)
+
+
+# ### Regression coefficients
+
+def coefficient_bootstrap(moves, by='Player', features=model_features, target='Winrate_delta_for_move', n_resamples=10000,
+                          confidence=0.95, seed=0, chunk_size=500, workers=None):
+    #percentile intervals of the OLS coefficients of move_models.fit_ols, games resampled with replacement
+    features = list(features)
+    moves = _moves_frame(moves, features)
+    by = [by] if isinstance(by, str) else list(by or [])
+    group_code, keys = _group_codes(moves, by)
+    game_code, games = pd.factorize(moves['Game_num'], sort=True)
+    sums = game_sums(game_code, group_code, _ols_values(moves, features, target), len(games), len(keys))
+    n_terms = len(features) + 1
+    usable = independent_terms(sums.sum(axis=0)[:, :n_terms * n_terms].reshape(len(keys), n_terms, n_terms))
+    statistic = functools.partial(_ols_coefficients, usable=usable)
+    estimate = statistic(sums.sum(axis=0)[None])[0]
+    replicates = resample(_bootstrap_chunk, sums, statistic, n_resamples, seed, chunk_size, workers)
+    return _interval_table(keys, ['Intercept'] + features, estimate, replicates, confidence).rename(columns={'Statistic': 'Term'})
+
+
+def coefficient_permutation_test(moves, player_a, player_b, features=model_features, target='Winrate_delta_for_move',
+                                 n_resamples=10000, alternative='two-sided', seed=0, chunk_size=500, workers=None):
+    #do the OLS coefficients of player_a differ from player_b's? same game-by-game swaps as summary_permutation_test;
+    #only the terms that are in both players' models are compared
+    features = list(features)
+    moves = _moves_frame(moves, features)
+    keys, sums = _two_player_sums(moves, player_a, player_b, (), functools.partial(_ols_values, features=features, target=target))
+    n_terms = len(features) + 1
+    gram = sums.sum(axis=0)[:, 0, :n_terms * n_terms].reshape(2, n_terms, n_terms)
+    usable = independent_terms(gram).all(axis=0, keepdims=True)
+    statistic = functools.partial(_ols_coefficients, usable=np.repeat(usable, 2, axis=0))
+    table = _permutation_table((player_a, player_b), keys, ['Intercept'] + features, sums, statistic, alternative, n_resamples=n_resamples, seed=seed,
+                               chunk_size=chunk_size, workers=workers)
+    return table.rename(columns={'Statistic': 'Term'})
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Time and move-quality summaries per player
+#
+# Plain pandas on the player move store (move_pipeline.player_move_store), so
+# summaries never pull in the plotting libraries.
+
+import numpy as np
+import pandas as pd
+
+from move_pipeline import move_label_list
+
+
+summary_measures = ['Seconds_spent', 'Seconds_remaining']
+
+
+def time_quality_summary(store, quantiles=(0.25, 0.75), measures=summary_measures):
+    #one grouped aggregation keyed by (Player, Includes_prep, Verbose_label), tidy: one row per group
+    #Includes_prep=True summarizes all of a player's moves, False only the moves played after leaving prep
+    #columns: Moves, then <measure>_mean, _median and _q<percent> for every measure
+    in_prep = store['In_prep'].to_numpy(dtype=bool)
+    rows = np.concatenate([np.arange(len(store)), np.flatnonzero(~in_prep)])
+    moves = pd.DataFrame({'Player': store.index.to_numpy()[rows], 'Includes_prep': np.arange(len(rows)) < len(store),
+                          'Verbose_label': store['Verbose_label'].to_numpy()[rows]})
+    for measure in measures:
+        moves[measure] = store[measure].to_numpy()[rows]
+
+    grouped = moves.groupby(['Player', 'Includes_prep', 'Verbose_label'], observed=True, sort=True)[measures]
+    stats = grouped.agg(['mean', 'median'])
+    stats.columns = ['{}_{}'.format(measure, stat) for measure, stat in stats.columns]
+    if quantiles:
+        spread = grouped.quantile(list(quantiles)).unstack()
+        spread.columns = ['{}_q{:g}'.format(measure, q * 100) for measure, q in spread.columns]
+        stats = stats.join(spread)
+    stats = stats[[column for measure in measures for column in stats.columns if column.startswith(measure + '_')]]
+    stats.insert(0, 'Moves', grouped.size())
+    return stats.round(2).reset_index()
+
+
+def chessboard_data(summary, prep=True, players=None, labels=move_label_list[1:]):
+    #rows of a time_quality_summary in the long format the chessboard figure draws:
+    #color (label), x (mean seconds spent), y (mean seconds remaining), size (moves) and shape (player)
+    #players: {full name: shape name} to keep and rename, in marker order (default: every player)
+    data = summary[(summary['Includes_prep'] == prep) & summary['Verbose_label'].isin(labels)]
+    players = players or {name: name for name in data['Player'].unique()}
+    data = data[data['Player'].isin(list(players))]
+    player_order = data['Player'].map({name: i for i, name in enumerate(players)})
+    label_order = data['Verbose_label'].map({label: i for i, label in enumerate(labels)}).astype(int)
+    data = data.iloc[np.lexsort([label_order.to_numpy(), player_order.to_numpy()])]
+    return pd.DataFrame({'color': data['Verbose_label'].astype(str).to_numpy(), 'x': data['Seconds_spent_mean'].to_numpy(),
+                         'y': data['Seconds_remaining_mean'].to_numpy(), 'size': data['Moves'].to_numpy(),
+                         'shape': data['Player'].map(players).to_numpy()})
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Process-pool driver for move_pipeline.process_games
+#
+# Games are independent of each other once they are parsed, so the games table (or
+# a list of whole pgn files) is cut into shards and every shard runs the full
+# pipeline in its own process. Shards come back in submission order and are
+# concatenated once, so the result is identical to a serial run whatever the
+# number of workers.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from pgn_reader import read_games_df
+from move_pipeline import compact_move_table, process_games
+
+
+def _process_shard(games_df, first_game_num, params):
+    moves_df = process_games(games_df, **params)
+    moves_df['Game_num'] += first_game_num
+    return moves_df
+
+
+def _process_file(path, params):
+    games_df = read_games_df(path)
+    return len(games_df), process_games(games_df, **params)
+
+
+def _run(function, jobs, workers):
+    #workers=1 runs in this process, which is handy for debugging and for tiny inputs
+    if workers == 1:
+        return [function(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(function, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def process_games_parallel(games_df, workers=None, shard_size=250, **params):
+    #params go to process_games; heuristics passed in them must be picklable (module-level functions or functools.partial)
+    workers = workers or os.cpu_count()
+    #shards would each get their own categories, so compacting waits for the concatenated table
+    compact = params.pop('compact', False)
+    games_df = games_df.reset_index(drop=True)
+    jobs = [(games_df.iloc[start:start + shard_size], start, params) for start in range(0, len(games_df), shard_size)]
+    if not jobs:
+        return process_games(games_df, compact=compact, **params)
+    moves_df = pd.concat(_run(_process_shard, jobs, workers), ignore_index=True)
+    return compact_move_table(moves_df) if compact else moves_df
+
+
+def process_pgn_files_parallel(pgn_paths, workers=None, **params):
+    #one job per file; games keep the numbering read_pgn_files would give them
+    workers = workers or os.cpu_count()
+    compact = params.pop('compact', False)
+    results = _run(_process_file, [(path, params) for path in pgn_paths], workers)
+    first_game_num = 0
+    moves = []
+    for game_count, moves_df in results:
+        moves_df['Game_num'] += first_game_num
+        moves.append(moves_df)
+        first_game_num += game_count
+    moves_df = pd.concat(moves, ignore_index=True)
+    return compact_move_table(moves_df) if compact else moves_df
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Positions of the games, replayed from their SAN moves
+#
+# A small standard-chess board with just enough move generation to resolve SAN
+# (including disambiguation by pins), castling rights and en passant. Every
+# position gets a normalized FEN: no move counters, and an en passant square only
+# when a pawn can actually capture there. Transpositions, and the same opening in
+# different games, therefore share one key.
+#
+#   board = Board()
+#   board.push_san('e4')
+#   board.position_key()    #'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq -'
+
+import re
+
+import numpy as np
+import pandas as pd
+
+
+start_fen = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+san_move = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+knight_steps = [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+king_steps = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+rook_directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+bishop_directions = [(1, 1), (-1, 1), (-1, -1), (1, -1)]
+#(steps, sliding) of every piece but the pawn
+piece_moves = {'N': (knight_steps, False), 'K': (king_steps, False), 'R': (rook_directions, True),
+               'B': (bishop_directions, True), 'Q': (rook_directions + bishop_directions, True)}
+#castling rights lost when a piece leaves or lands on the square
+castling_squares = {4: 'KQ', 7: 'K', 0: 'Q', 60: 'kq', 63: 'k', 56: 'q'}
+
+
+def square_index(name):
+    #'e4' -> 28 (a1 is 0, h8 is 63)
+    return 'abcdefgh'.index(name[0]) + 8 * (int(name[1]) - 1)
+
+
+def square_name(square):
+    return 'abcdefgh'[square % 8] + str(square // 8 + 1)
+
+
+class Board:
+
+    def __init__(self, fen=start_fen):
+        placement, turn, castling, en_passant, *counters = fen.split()
+        self.squares = ['.'] * 64
+        for rank, row in enumerate(reversed(placement.split('/'))):
+            file = 0
+            for char in row:
+                if char.isdigit():
+                    file += int(char)
+                else:
+                    self.squares[rank * 8 + file] = char
+                    file += 1
+        self.white_to_move = turn == 'w'
+        self.castling = '' if castling == '-' else castling
+        self.en_passant = None if en_passant == '-' else square_index(en_passant)
+        self.halfmove, self.fullmove = (int(counters[0]), int(counters[1])) if len(counters) == 2 else (0, 1)
+
+    def _piece(self, piece, white=None):
+        #piece letter in the case of the side to move (or of white=True/False)
+        return piece.upper() if (self.white_to_move if white is None else white) else piece.lower()
+
+    def _reach(self, square, steps, sliding, squares=None):
+        #squares reached from square along steps, a slider stopping at the first piece in its way
+        squares = squares or self.squares
+        file, rank = square % 8, square // 8
+        for file_step, rank_step in steps:
+            f, r = file + file_step, rank + rank_step
+            while 0 <= f < 8 and 0 <= r < 8:
+                yield r * 8 + f
+                if not sliding or squares[r * 8 + f] != '.':
+                    break
+                f, r = f + file_step, r + rank_step
+
+    def attacked(self, square, by_white, squares=None):
+        #is square attacked by a piece of that color (on squares, the current board by default)?
+        squares = squares or self.squares
+        #queens are found along the rook and bishop lines
+        for piece in 'NKRB':
+            steps, sliding = piece_moves[piece]
+            attackers = {self._piece(piece, by_white), self._piece('Q', by_white) if sliding else None}
+            if any(squares[s] in attackers for s in self._reach(square, steps, sliding, squares)):
+                return True
+        #a white pawn attacks diagonally upwards, so it sits one rank below the square
+        rank = square // 8 + (-1 if by_white else 1)
+        if 0 <= rank < 8:
+            for file in (square % 8 - 1, square % 8 + 1):
+                if 0 <= file < 8 and squares[rank * 8 + file] == self._piece('P', by_white):
+                    return True
+        return False
+
+    def _origins(self, piece, target):
+        #squares a piece of the side to move could come to target from, without looking at pins
+        if piece == 'P':
+            forward = 8 if self.white_to_move else -8
+            pawn = self._piece('P')
+            if self.squares[target] == '.' and target != self.en_passant:
+                one_back = target - forward
+                if self.squares[one_back] == pawn:
+                    return [one_back]
+                double_rank = 3 if self.white_to_move else 4
+                if self.squares[one_back] == '.' and target // 8 == double_rank and self.squares[one_back - forward] == pawn:
+                    return [one_back - forward]
+                return []
+            return [target - forward + step for step in (-1, 1) if 0 <= target % 8 + step < 8 and self.squares[target - forward + step] == pawn]
+        steps, sliding = piece_moves[piece]
+        return [s for s in self._reach(target, steps, sliding) if self.squares[s] == self._piece(piece)]
+
+    def _after(self, origin, target, promotion=None):
+        #the squares after moving origin to target (captures and en passant included)
+        squares = list(self.squares)
+        moving = squares[origin]
+        if moving in 'Pp' and target == self.en_passant and squares[target] == '.':
+            squares[target - (8 if self.white_to_move else -8)] = '.'
+        squares[target] = self._piece(promotion) if promotion else moving
+        squares[origin] = '.'
+        return squares
+
+    def _legal(self, origin, target):
+        squares = self._after(origin, target)
+        return not self.attacked(squares.index(self._piece('K')), not self.white_to_move, squares)
+
+    def _play(self, origin, target, promotion=None):
+        moving, captured = self.squares[origin], self.squares[target]
+        resets_clock = moving in 'Pp' or captured != '.'
+        self.squares = self._after(origin, target, promotion)
+        for square in (origin, target):
+            self.castling = ''.join(right for right in self.castling if right not in castling_squares.get(square, ''))
+        self.en_passant = (origin + target) // 2 if moving in 'Pp' and abs(target - origin) == 16 else None
+        self.halfmove = 0 if resets_clock else self.halfmove + 1
+        self.fullmove += not self.white_to_move
+        self.white_to_move = not self.white_to_move
+
+    def push_san(self, san):
+        #plays one move in SAN ('e4', 'Nbd7', 'exd6', 'e8=Q+', 'O-O-O'); ValueError for a move that is not legal here
+        san = san.rstrip('+#!?')
+        if san in ('O-O', 'O-O-O', '0-0', '0-0-0'):
+            back_rank = 0 if self.white_to_move else 56
+            long = len(san) == 5
+            king_target, rook_origin, rook_target = (back_rank + 2, back_rank, back_rank + 3) if long else (back_rank + 6, back_rank + 7, back_rank + 5)
+            #the squares between king and rook are empty, and the king is not in check on its way, itself included
+            between = range(min(rook_origin, back_rank + 4) + 1, max(rook_origin, back_rank + 4))
+            king_path = range(min(back_rank + 4, king_target), max(back_rank + 4, king_target) + 1)
+            allowed = (self._piece('Q' if long else 'K') in self.castling and self.squares[back_rank + 4] == self._piece('K')
+                       and self.squares[rook_origin] == self._piece('R') and all(self.squares[s] == '.' for s in between)
+                       and not any(self.attacked(s, not self.white_to_move) for s in king_path))
+            if not allowed:
+                raise ValueError('{} is illegal in {}'.format(san, self.fen()))
+            self.squares[rook_target], self.squares[rook_origin] = self.squares[rook_origin], '.'
+            self._play(back_rank + 4, king_target)
+            return self
+        match = san_move.match(san)
+        if not match:
+            raise ValueError('{} is not a SAN move'.format(san))
+        piece, from_file, from_rank, target, promotion = match.groups()
+        target = square_index(target)
+        if self.squares[target] != '.' and self.squares[target].isupper() == self.white_to_move:
+            raise ValueError('{} lands on a piece of its own side in {}'.format(san, self.fen()))
+        origins = [s for s in self._origins(piece or 'P', target)
+                   if (from_file is None or 'abcdefgh'[s % 8] == from_file) and (from_rank is None or str(s // 8 + 1) == from_rank)]
+        #a pinned piece cannot make the move (this also decides between two pieces that could)
+        origins = [s for s in origins if self._legal(s, target)]
+        if len(origins) != 1:
+            raise ValueError('{} is {} in {}'.format(san, 'ambiguous' if origins else 'illegal', self.fen()))
+        self._play(origins[0], target, promotion)
+        return self
+
+    def position_key(self):
+        #normalized FEN: placement, side to move, castling and the en passant square only when the capture is legal
+        #(not when the capturing pawn is pinned, or the capture leaves the king in check), so equal positions share one key
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ''.join(self.squares[rank * 8:rank * 8 + 8])
+            rows.append(re.sub(r'\.+', lambda empty: str(len(empty.group())), row))
+        en_passant = '-'
+        if self.en_passant is not None and any(self._legal(s, self.en_passant) for s in self._origins('P', self.en_passant)):
+            en_passant = square_name(self.en_passant)
+        return '{} {} {} {}'.format('/'.join(rows), 'w' if self.white_to_move else 'b', self.castling or '-', en_passant)
+
+    def fen(self):
+        return '{} {} {}'.format(self.position_key(), self.halfmove, self.fullmove)
+
+
+def replay_game(moves, fen=start_fen):
+    #normalized FEN after every move of one game; ValueError names the ply of a move that is not legal
+    board = Board(fen)
+    fens = []
+    for ply, san in enumerate(moves):
+        try:
+            fens.append(board.push_san(san).position_key())
+        except ValueError as error:
+            raise ValueError('ply {}: {}'.format(ply, error)) from None
+    return fens
+
+
+def game_start_fens(games_df):
+    #FEN tag of every game set up from a position, NaN for games from the start position (no FEN, or SetUp "0")
+    if 'FEN' not in games_df.columns:
+        return pd.Series(np.nan, index=games_df.index, dtype=object)
+    set_up = games_df['SetUp'] if 'SetUp' in games_df.columns else pd.Series(np.nan, index=games_df.index)
+    return games_df['FEN'].where(set_up.fillna('1').astype(str).str.strip() != '0')
+
+
+def add_position_columns(moves_df, start_fens=None):
+    #Fen: normalized FEN of the position after the move, the position its [%eval] is about
+    #start_fens: starting FEN by Game_num for games that do not start from the initial position
+    moves_df = moves_df.copy()
+    game_num = moves_df['Game_num'].to_numpy()
+    sans = moves_df['Move'].to_numpy(dtype=object)
+    starts = np.flatnonzero(np.r_[True, game_num[1:] != game_num[:-1]])
+    ends = np.r_[starts[1:], len(moves_df)]
+    fens = np.empty(len(moves_df), dtype=object)
+    for start, end in zip(starts, ends):
+        fen = start_fens.get(game_num[start]) if start_fens is not None else None
+        try:
+            fens[start:end] = replay_game(sans[start:end], fen if isinstance(fen, str) else start_fen)
+        except ValueError as error:
+            raise ValueError('game {}, {}'.format(game_num[start], error)) from None
+    moves_df['Fen'] = fens
+    return moves_df
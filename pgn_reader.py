@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Streaming PGN reader
+#
+# Games are read one at a time from the file handle, so memory use does not grow
+# with the size of the archive. Movetext may be wrapped over any number of lines,
+# and {} comments may span line breaks.
+
+import re
+
+import pandas as pd
+
+
+#metadata columns kept for every game, in this order; SetUp "1" and FEN are the starting position of a game set up from one
+GAME_COLUMNS = ['Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result', 'ECO', 'Opening', 'TimeControl', 'SetUp', 'FEN', 'raw_pgn']
+
+tag_pattern = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+
+
+#movetext of a finished game ends with its result; '*' is a game still in progress
+game_results = ('1-0', '0-1', '1/2-1/2')
+
+
+def _open_pgn(source):
+    if hasattr(source, 'read'):
+        return source, False
+    return open(source, 'rb'), True
+
+
+def iter_pgn_games(source, start_offset=0, with_offsets=False):
+    #yields one dict per game: the tag pairs plus the movetext joined into 'raw_pgn'
+    #with_offsets=True yields (game, offset) pairs, offset being the byte just past the game's last line
+    handle, owned = _open_pgn(source)
+    try:
+        if start_offset:
+            handle.seek(start_offset)
+        offset = start_offset
+        game_end = start_offset
+        tags = {}
+        movetext = []
+        in_comment = False
+        for raw_line in handle:
+            line_end = offset + len(raw_line)
+            offset = line_end
+            #a byte that is not utf-8 (a stray latin-1 name) becomes U+FFFD instead of stopping the archive;
+            #a byte order mark in front of the first tag would hide it from the '[' check
+            line = (raw_line.decode('utf-8', errors='replace') if isinstance(raw_line, bytes) else raw_line).lstrip('\ufeff').strip()
+            if not line or line.startswith('%'):
+                continue
+            #a tag line only counts as a tag when we are not inside a {} comment
+            if not in_comment and line[0] == '[':
+                if movetext:
+                    tags['raw_pgn'] = ' '.join(movetext)
+                    yield (tags, game_end) if with_offsets else tags
+                    tags = {}
+                    movetext = []
+                match = tag_pattern.match(line)
+                if match:
+                    tags[match.group(1)] = match.group(2).replace('\\"', '"').strip()
+                game_end = line_end
+                continue
+            movetext.append(line)
+            game_end = line_end
+            #pgn comments do not nest, so the last brace on the line decides the state
+            last_open = line.rfind('{')
+            last_close = line.rfind('}')
+            if last_open != last_close:
+                in_comment = last_open > last_close
+        if movetext or tags:
+            tags['raw_pgn'] = ' '.join(movetext)
+            yield (tags, game_end) if with_offsets else tags
+    finally:
+        if owned:
+            handle.close()
+
+
+def game_is_finished(game):
+    movetext = game.get('raw_pgn', '').split()
+    return bool(movetext) and movetext[-1] in game_results
+
+
+def iter_games_df(source, chunksize=1000, columns=GAME_COLUMNS):
+    #groups the game stream into DataFrames of at most chunksize rows
+    batch = []
+    for game in iter_pgn_games(source):
+        batch.append(game)
+        if len(batch) == chunksize:
+            yield pd.DataFrame(batch, columns=columns)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=columns)
+
+
+def read_games_df(source, chunksize=1000, columns=GAME_COLUMNS):
+    #games DataFrame for a whole file, assembled from fixed-size batches
+    chunks = list(iter_games_df(source, chunksize=chunksize, columns=columns))
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(chunks, ignore_index=True)
+
+
+#one scanner for the movetext of every game: stray comments are matched and thrown away,
+#moves are kept together with the comment that follows them (if any)
+#castling is also written with zeros in hand-entered games; SAN has no other zeros, so Move replaces them with O
+san = r'(?:[KQRBN]?[a-h]?[1-8]?x?[a-h][1-8](?:=[QRBN])?|O-O(?:-O)?|0-0(?:-0)?)[+#]?'
+move_pattern = r'\{[^}]*\}|;[^\n]*|(?:\d+\.+\s*)?(?P<Move>' + san + r')[!?]*\s*(?:\{(?P<Comment>[^}]*)\})?'
+eval_pattern = re.compile(r'\[%eval\s+([^\]\s]+)')
+clk_pattern = re.compile(r'\[%clk\s+([^\]\s]+)')
+#an innermost (...) variation, with the comments inside it; comments are matched too so parentheses in them are kept
+variation_pattern = re.compile(r'\{[^}]*\}|\((?:[^(){}]|\{[^}]*\})*\)')
+
+
+def _drop_variation(match):
+    return match.group() if match.group()[0] == '{' else ' '
+
+
+def strip_variations(pgns):
+    #movetext without its (...) variations, nested ones included, so only the mainline is tokenized
+    pgns = pd.Series(pgns, dtype=object)
+    has_variation = pgns.str.contains('(', regex=False).fillna(False).to_numpy(dtype=bool, copy=True)
+    while has_variation.any():
+        stripped = pgns[has_variation].str.replace(variation_pattern, _drop_variation, regex=True)
+        changed = (stripped != pgns[has_variation]).to_numpy()
+        pgns[has_variation] = stripped
+        has_variation[has_variation] = changed
+    return pgns
+
+
+def tokenize_movetext(pgns):
+    #parses the movetext of all games into one table, one row per half-move (ply)
+    pgns = strip_variations(pd.Series(pgns).reset_index(drop=True))
+    tokens = pgns.str.extractall(move_pattern)
+    tokens = tokens[tokens['Move'].notna()]
+
+    moves_df = pd.DataFrame({'Game_num': tokens.index.get_level_values(0).astype(int)})
+    moves_df['Ply'] = moves_df.groupby('Game_num').cumcount()
+    moves_df['Move_num'] = moves_df['Ply'] // 2 + 1
+    moves_df['Move'] = tokens['Move'].str.replace('0', 'O', regex=False).to_numpy()
+    #moves without [%eval] (e.g. the final mating move) are kept with a null evaluation
+    comments = pd.Series(tokens['Comment'].to_numpy())
+    moves_df['Evaluation'] = comments.str.extract(eval_pattern, expand=False)
+    moves_df['Timestamp'] = comments.str.extract(clk_pattern, expand=False)
+    return moves_df
+
+
+def read_pgn_files(paths, chunksize=1000, columns=GAME_COLUMNS):
+    #games of several pgn files stacked in file order; the row number is the Game_num used everywhere else
+    return pd.concat([read_games_df(path, chunksize=chunksize, columns=columns) for path in paths], ignore_index=True)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Per-stage instrumentation
+#
+# A StageProfiler records, for every stage it runs: wall time, rows in and out,
+# the process's peak RSS so far and, with memory=True, the stage's own peak traced
+# allocation (tracemalloc, which slows pandas code down noticeably). With
+# cprofile_dir set, every stage also leaves a cProfile dump there. A disabled
+# profiler calls the stage directly and records nothing.
+#
+#   profiler = StageProfiler(memory=True, cprofile_dir='profiles')
+#   moves_df = profiler.run('clock', add_clock_columns, moves_df, time_controls)
+#   profiler.report()
+
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  #windows
+    resource = None
+
+
+def _rows(value):
+    #row count of a stage's input or output; (table, extra) tuples count the table
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if isinstance(value, (str, bytes)) or not hasattr(value, '__len__'):
+        return None
+    return len(value)
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on linux, bytes on macos
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class StageProfiler:
+
+    def __init__(self, enabled=True, memory=False, cprofile_dir=None):
+        self.enabled = enabled
+        self.memory = memory
+        self.cprofile_dir = cprofile_dir
+        self.records = []
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None):
+        #times the with-block; set record['rows_out'] inside it when the stage has a row count
+        record = {'stage': name, 'rows_in': rows_in, 'rows_out': None}
+        if not self.enabled:
+            yield record
+            return
+        started_tracing = self.memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.memory:
+            tracemalloc.reset_peak()
+        profile = cProfile.Profile() if self.cprofile_dir else None
+        start = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile:
+                profile.disable()
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            if self.memory:
+                record['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 3)
+                if started_tracing:
+                    tracemalloc.stop()
+            record['max_rss_mb'] = max_rss_mb()
+            if profile:
+                os.makedirs(self.cprofile_dir, exist_ok=True)
+                record['cprofile'] = os.path.join(self.cprofile_dir, '{:03d}-{}.prof'.format(len(self.records), name))
+                profile.dump_stats(record['cprofile'])
+            self.records.append(record)
+
+    def run(self, name, function, *args, **kwargs):
+        #function(*args, **kwargs) as a stage; rows_in is the length of the first argument
+        if not self.enabled:
+            return function(*args, **kwargs)
+        with self.stage(name, _rows(args[0]) if args else None) as record:
+            result = function(*args, **kwargs)
+            record['rows_out'] = _rows(result)
+        return result
+
+    def report(self):
+        #one row per stage run, in order
+        import pandas as pd
+        return pd.DataFrame(self.records, columns=['stage', 'seconds', 'rows_in', 'rows_out', 'peak_mb', 'max_rss_mb', 'cprofile'])
+
+    def save_report(self, path):
+        with open(path, 'w') as f:
+            json.dump({'total_seconds': round(sum(r['seconds'] for r in self.records), 6), 'stages': self.records}, f, indent=2)
+
+
+#the profiler used when none is given: stages run as plain calls
+no_profiler = StageProfiler(enabled=False)
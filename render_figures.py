@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Batch rendering of the report figures
+#
+# A figure job is (name, move_plots function name, args, kwargs). Jobs are spread
+# over a process pool, every worker renders on the Agg backend and writes one
+# file per format. The hash of each job's input data and of FIGURE_VERSION is kept
+# in manifest.json next to the figures; a job whose hash and files are unchanged is
+# skipped, so re-rendering a report only draws what its new games changed.
+#
+#   jobs = report_jobs(store, games_df)
+#   render_figures(jobs, 'figures', formats=('png', 'svg'))
+
+import hashlib
+import importlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from move_pipeline import normalize_player_name
+from move_summary import chessboard_data, time_quality_summary
+from figure_layout import grid_pages, notebook_player_colors, player_color_map
+
+
+#part of every job hash; bump it whenever a move_plots function changes what it draws
+FIGURE_VERSION = 2
+
+
+def _update_hash(key, value):
+    if isinstance(value, pd.Series):
+        value = value.to_frame()
+    if isinstance(value, pd.DataFrame):
+        key.update(repr((list(value.columns), [str(dtype) for dtype in value.dtypes])).encode())
+        key.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, (list, tuple)):
+        key.update(b'[')
+        for item in value:
+            _update_hash(key, item)
+        key.update(b']')
+    elif isinstance(value, dict):
+        _update_hash(key, sorted(value.items()))
+    else:
+        key.update(repr(value).encode())
+
+
+def job_hash(function, args, kwargs):
+    key = hashlib.sha256('v{}\0{}'.format(FIGURE_VERSION, function).encode())
+    _update_hash(key, args)
+    _update_hash(key, kwargs)
+    return key.hexdigest()
+
+
+def _render(function, args, kwargs, paths):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig = getattr(importlib.import_module('move_plots'), function)(*args, **kwargs)
+    for path in paths:
+        fig.savefig(path)
+    plt.close(fig)
+    return paths
+
+
+def render_figures(jobs, out_dir, formats=('png',), workers=None, force=False):
+    #returns {name: 'rendered' or 'unchanged'}
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    status = {}
+    todo = []
+    for name, function, args, kwargs in jobs:
+        digest = job_hash(function, args, kwargs)
+        paths = [os.path.join(out_dir, '{}.{}'.format(name, fmt)) for fmt in formats]
+        if manifest.get(name) == digest and all(os.path.exists(path) for path in paths):
+            status[name] = 'unchanged'
+        else:
+            todo.append((name, digest, (function, args, kwargs, paths)))
+
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(todo) <= 1:
+        for _, _, job in todo:
+            _render(*job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_render, *job) for _, _, job in todo]
+            for future in futures:
+                future.result()
+    for name, digest, _ in todo:
+        manifest[name] = digest
+        status[name] = 'rendered'
+
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return status
+
+
+# ### Report
+
+game_plot_cols = ['Game_num', 'Ply', 'Winrate_delta_for_move', 'Seconds_spent']
+
+
+def _slug(text):
+    return re.sub(r'[^0-9A-Za-z]+', '_', str(text)).strip('_').lower()
+
+
+def report_jobs(store, games_df, max_rows=6, max_cols=3, move_time_colors=notebook_player_colors):
+    #store: player move store (move_pipeline.player_move_store); games_df indexed by Game_num
+    #move_time_colors: {player: (colormap, legend color)} of the move time figure, see move_plots.move_time_figure
+    #the summary figures, the small-multiples pages of every event and one figure per game;
+    #every job only carries the data it draws
+    jobs = []
+    summary = time_quality_summary(store, quantiles=())
+    for prep, name, title in [(True, 'chessboard_prep', 'Including Prep'), (False, 'chessboard_no_prep', 'No Prep')]:
+        jobs.append((name, 'chessboard_figure', (chessboard_data(summary, prep=prep),), {'title': title}))
+    no_prep = store.loc[~store['In_prep'], ['Seconds_spent', 'Seconds_remaining', 'Move_label']]
+    players = [(player, moves) for player, moves in no_prep.groupby(level=0, sort=False)]
+    colors = {player: move_time_colors[player] for player, _ in players if player in move_time_colors}
+    jobs.append(('move_time', 'move_time_figure', (players,), {'colors': colors}))
+
+    game_moves = store.reset_index(drop=True)[game_plot_cols].sort_values(['Game_num', 'Ply'])
+    game_num = game_moves['Game_num'].to_numpy()
+    for event, event_games in games_df.groupby('Event', sort=False):
+        colors = player_color_map(event_games)
+        for page, (page_games, ncols, nrows, first_number) in enumerate(grid_pages(event_games, max_rows, max_cols)):
+            page_moves = game_moves[np.isin(game_num, page_games.index.to_numpy())].reset_index(drop=True)
+            jobs.append(('grid_{}_{:02d}'.format(_slug(event), page + 1), 'game_grid_figure',
+                         (page_moves, page_games[['White', 'Black']], ncols, nrows, colors, first_number), {}))
+
+    white = normalize_player_name(games_df['White'])
+    black = normalize_player_name(games_df['Black'])
+    for game_num, moves in game_moves.groupby('Game_num'):
+        title = '{} - {}, {} round {}'.format(white[game_num], black[game_num], games_df['Event'][game_num], games_df['Round'][game_num])
+        jobs.append(('game_{:04d}'.format(game_num), 'game_figure', (moves.reset_index(drop=True), white[game_num], black[game_num]), {'title': title}))
+    return jobs
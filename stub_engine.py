@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Stand-in UCI engine
+#
+# Speaks enough UCI for engine_eval.py (uci, isready, setoption, ucinewgame,
+# position fen, go, quit) and answers every search at once with the material
+# balance of the position, from the side to move, in centipawns. It is
+# deterministic, needs no chess engine installed, and lets the re-evaluation
+# stage run anywhere:
+#
+#   reevaluate_moves(moves_df, engine=[sys.executable, 'stub_engine.py'], depth=1)
+
+import sys
+
+piece_values = {'p': 100, 'n': 300, 'b': 300, 'r': 500, 'q': 900}
+
+
+def material_score(fen):
+    placement, turn = fen.split()[:2]
+    score = sum(piece_values.get(char.lower(), 0) * (1 if char.isupper() else -1) for char in placement if char.isalpha())
+    return score if turn == 'w' else -score
+
+
+def main(stdin=sys.stdin, stdout=sys.stdout):
+    fen = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+    for line in stdin:
+        command, _, args = line.strip().partition(' ')
+        if command == 'uci':
+            print('id name stub_engine', 'id author none', 'uciok', sep='\n', file=stdout, flush=True)
+        elif command == 'isready':
+            print('readyok', file=stdout, flush=True)
+        elif command == 'position':
+            if args.startswith('fen '):
+                fen = args[len('fen '):].split(' moves ')[0]
+            elif args.startswith('startpos'):
+                fen = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+        elif command == 'go':
+            limits = args.split()
+            depth = limits[limits.index('depth') + 1] if 'depth' in limits else '1'
+            print('info depth {} score cp {} nodes 1'.format(depth, material_score(fen)), 'bestmove 0000', sep='\n', file=stdout, flush=True)
+        elif command == 'quit':
+            break
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import pandas as pd
+
+import move_cache
+
+
+def test_cache_keys_change_with_the_cache_version(tmp_path, monkeypatch):
+    pgn = tmp_path / 'games.pgn'
+    pgn.write_text('[Event "a"]\n\n1. e4 e5 1-0\n')
+    key = move_cache.cache_key([str(pgn)], {'compact': True})
+    live_dir = move_cache.live_table_dir(str(pgn))
+    assert move_cache.cache_key([str(pgn)], {'compact': True}) == key
+
+    monkeypatch.setattr(move_cache, 'CACHE_VERSION', move_cache.CACHE_VERSION + 1)
+    assert move_cache.cache_key([str(pgn)], {'compact': True}) != key
+    assert move_cache.live_table_dir(str(pgn)) != live_dir
+
+
+def test_warm_cache_does_not_parse_the_pgn(tmp_path, monkeypatch):
+    pgn = tmp_path / 'games.pgn'
+    pgn.write_text('[White "Carlsen, Magnus"]\n[Black "Ding, Liren"]\n\n'
+                   '1. e4 { [%eval 0.3] [%clk 1:59:50] } 1... e5 { [%eval 0.3] [%clk 1:59:40] } 1-0\n')
+    games, moves = move_cache.cached_tables([str(pgn)], cache_dir=str(tmp_path / 'cache'))
+
+    def parse(paths):
+        raise AssertionError('pgn parsed on a warm cache')
+    monkeypatch.setattr(move_cache, 'read_pgn_files', parse)
+    warm_games, warm_moves = move_cache.cached_tables([str(pgn)], cache_dir=str(tmp_path / 'cache'))
+    assert warm_games['White'].tolist() == ['Carlsen, Magnus']
+    assert 'raw_pgn' not in warm_games.columns
+    assert warm_moves['Move'].tolist() == moves['Move'].tolist() == ['e4', 'e5']
+
+
+def _game(white, black, movetext):
+    return '[White "{}"]\n[Black "{}"]\n[TimeControl "300+2"]\n\n{}\n\n'.format(white, black, movetext)
+
+
+def test_incremental_ingest_matches_a_cold_run(tmp_path):
+    pgn = tmp_path / 'live.pgn'
+    finished = _game('a', 'b', '1. e4 { [%eval 0.3] [%clk 0:04:58] } 1... e5 { [%eval 0.3] [%clk 0:04:55] } 1-0')
+    #the second game is still being played: no result yet, so it waits for the next call
+    playing = _game('c', 'd', '1. d4 { [%eval 0.2] [%clk 0:04:59] } 1... d5 { [%eval 0.2] [%clk 0:04:50] }')
+    pgn.write_text(finished + playing)
+    cache_dir = str(tmp_path / 'cache')
+    games, moves = move_cache.ingest_incremental(str(pgn), cache_dir=cache_dir)
+    assert games['White'].tolist() == ['a'] and moves['Game_num'].unique().tolist() == [0]
+
+    with open(pgn, 'a') as f:
+        f.write(' 2. c4 { [%eval 0.2] [%clk 0:04:57] } 0-1\n\n')
+        f.write(_game('e', 'f', '1. c4 { [%eval 0.1] [%clk 0:04:56] } 1-0'))
+    games, moves = move_cache.ingest_incremental(str(pgn), cache_dir=cache_dir)
+    assert games['White'].tolist() == ['c', 'e'] and moves['Game_num'].unique().tolist() == [1, 2]
+
+    live = move_cache.load_move_table(move_cache.live_table_dir(str(pgn), cache_dir=cache_dir))
+    cold = move_cache.process_games(move_cache.read_pgn_files([str(pgn)]))
+    pd.testing.assert_frame_equal(live.reset_index(drop=True), cold.reset_index(drop=True), check_dtype=False, check_categorical=False)
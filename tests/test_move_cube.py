@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from move_cube import MoveCube, cube_stats, spent_buckets, time_bucket
+from move_pipeline import add_player_columns, process_games
+from pgn_reader import read_pgn_files
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_missing_times_have_no_bucket():
+    buckets = time_bucket(pd.Series([30.0, np.nan, 5000.0]), spent_buckets)
+    assert buckets[0] == '<1 min' and pd.isna(buckets[1]) and buckets[2] == '20+ min'
+
+
+def test_means_are_over_the_moves_with_a_value():
+    sums = pd.DataFrame({'Moves': [3], 'Seconds_spent_count': [2], 'Seconds_spent_sum': [30.0], 'Seconds_spent_sumsq': [500.0]})
+    stats = cube_stats(sums, ['Seconds_spent'])
+    assert stats['Seconds_spent_mean'].tolist() == [15.0]
+
+
+def test_queries_match_a_groupby_over_the_moves():
+    games = read_pgn_files([os.path.join(root, 'WCC2023.pgn')])
+    moves = add_player_columns(process_games(games), games)
+    cube = MoveCube.from_moves(moves, games)
+
+    by = ['Player', 'Verbose_label']
+    query = cube.query(by, In_prep=False).sort_values(by).reset_index(drop=True)
+    grouped = moves[~moves['In_prep']].groupby(by, observed=True)['Seconds_spent']
+    expected = grouped.agg(['size', 'mean', 'std']).reset_index().sort_values(by).reset_index(drop=True)
+    assert query[by].astype(str).equals(expected[by].astype(str))
+    assert query['Moves'].tolist() == expected['size'].tolist()
+    np.testing.assert_allclose(query['Seconds_spent_mean'], expected['mean'])
+    np.testing.assert_allclose(query['Seconds_spent_std'], expected['std'], rtol=1e-6)
+
+    #everything rolled up, and the same rollup after adding the last game again
+    total = cube.query()
+    assert total['Moves'].item() == len(moves)
+    np.testing.assert_allclose(total['Winrate_delta_for_move_mean'].item(), moves['Winrate_delta_for_move'].mean())
+    last = moves['Game_num'].max()
+    cube.add(moves[moves['Game_num'] == last], games)
+    assert cube.query()['Moves'].item() == len(moves)
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from move_models import fit_logit, fit_ols, model_features
+
+
+def _moves(sizes, seed=0):
+    #groups of very different sizes, with a feature that is constant in the last group
+    rng = np.random.default_rng(seed)
+    player = np.repeat(np.arange(len(sizes)), sizes)
+    moves = pd.DataFrame({feature: rng.normal(size=len(player)) for feature in model_features})
+    moves['Player'] = player
+    moves.loc[moves['Player'] == len(sizes) - 1, 'Game_Intensity'] = 0
+    moves['Winrate_delta_for_move'] = 0.02 * moves['Game_Balance'] + rng.normal(scale=0.1, size=len(player))
+    return moves
+
+
+def test_ols_matches_least_squares_per_group():
+    moves = _moves([5000, 12, 40])
+    table = fit_ols(moves)
+    for player, group in moves.groupby('Player'):
+        X = np.column_stack([np.ones(len(group))] + [group[feature] for feature in model_features])
+        used = X.any(axis=0)
+        coef = np.linalg.lstsq(X[:, used], group['Winrate_delta_for_move'], rcond=None)[0]
+        rows = table[table['Player'] == player]
+        assert np.allclose(rows['Coef'].to_numpy()[used], coef)
+        assert np.isnan(rows['Coef'].to_numpy()[~used]).all()
+
+
+def test_logit_groups_of_different_sizes_converge():
+    moves = _moves([5000, 300, 200])
+    table = fit_logit(moves, blunder_threshold=-0.1)
+    assert table['Converged'].all()
+    for player, group in moves.groupby('Player'):
+        X = np.column_stack([np.ones(len(group))] + [group[feature] for feature in model_features])
+        X = X[:, X.any(axis=0)]
+        y = (group['Winrate_delta_for_move'] < -0.1).to_numpy(dtype=float)
+        coef = np.zeros(X.shape[1])
+        for _ in range(30):
+            p = 1 / (1 + np.exp(-X @ coef))
+            coef += np.linalg.solve(X.T @ (X * (p * (1 - p))[:, None]), X.T @ (y - p))
+        assert np.allclose(table.loc[table['Player'] == player, 'Coef'].dropna(), coef, atol=1e-6)
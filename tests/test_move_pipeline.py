@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from move_pipeline import add_clock_columns, clock_to_seconds, get_exp_score_for_pos, known_time_controls, parse_time_control
+from pgn_reader import tokenize_movetext
+
+
+def _clocks(double_first_increment=False):
+    #5400+30: 6 seconds on the first move, 30 seconds added after it
+    moves = tokenize_movetext(['1. e4 { [%clk 1:30:24] } 1... e5 { [%clk 1:30:10] } 2. Nf3 { [%clk 1:30:04] } *'])
+    return add_clock_columns(moves, pd.Series(['5400+30']), double_first_increment)
+
+
+def test_increment_is_credited_once_by_default():
+    assert _clocks()['Seconds_spent'].tolist() == [6, 20, 50]
+
+
+def test_double_first_increment_is_opt_in():
+    assert _clocks(double_first_increment=True)['Seconds_spent'].tolist() == [36, 50, 50]
+
+
+def test_clocks_in_any_format_missing_ones_nan():
+    seconds = clock_to_seconds(['1:59:53', '4:05', '0:00:07.4', None, '--'])
+    assert seconds[:3].tolist() == [7193, 245, 7]
+    assert np.isnan(seconds[3:]).all()
+    assert len(clock_to_seconds(pd.Series([], dtype=object))) == 0
+
+
+def test_clockless_games_have_no_times():
+    #game 0 has clocks, game 1 none, game 2 no moves, game 3 MM:SS clocks
+    moves = tokenize_movetext(['1. e4 { [%clk 1:30:24] } 1... e5 { [%clk 1:30:10] } *', '1. d4 d5 *', '*',
+                               '1. c4 { [%clk 2:55] } 1... c5 { [%clk 2:58] } *'])
+    moves = add_clock_columns(moves, pd.Series(['5400+30', '5400+30', '5400+30', '180+2']))
+    spent = moves.groupby('Game_num')['Seconds_spent'].apply(list)
+    assert spent[0] == [6, 20]
+    assert np.isnan(spent[1]).all()
+    assert spent[3] == [7, 4]
+    assert moves.loc[moves['Game_num'] == 1, 'Time_spent'].isna().all()
+
+    no_clocks = add_clock_columns(tokenize_movetext(['1. e4 e5 *']), pd.Series(['5400+30']))
+    assert no_clocks['Seconds_spent'].isna().all() and no_clocks['Seconds_remaining'].isna().all()
+
+
+def test_unknown_time_control_falls_back_per_game():
+    assert parse_time_control('-') is None and parse_time_control('?') is None
+    assert known_time_controls(pd.Series(['?', '-', '300+2', None])).fillna('600').tolist() == ['600', '600', '300+2', '600']
+
+    moves = tokenize_movetext(['1. e4 { [%clk 0:04:58] } *', '1. e4 { [%clk 0:04:58] } *'])
+    moves = add_clock_columns(moves, pd.Series(['-', '300+2']))
+    assert np.isnan(moves['Seconds_spent'].iloc[0])
+    assert moves['Seconds_spent'].iloc[1] == 4
+
+
+def test_exp_score_steps_include_their_upper_edge():
+    evaluation = [-3, -2.25, -2.2, -1.75, -1.7, -0.25, -0.2, 0, 0.25, 0.3, 2.25, 2.3, np.nan]
+    expected = [0.0, np.nan, 0.1, 0.1, 0.2, 0.4, 0.5, 0.5, 0.5, 0.6, 0.9, 1.0, np.nan]
+    np.testing.assert_array_equal(get_exp_score_for_pos(evaluation), expected)
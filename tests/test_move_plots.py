@@ -0,0 +1,42 @@
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from move_pipeline import process_games
+from move_plots import move_time_figure
+from pgn_reader import read_pgn_files
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def compact_moves():
+    games = read_pgn_files([os.path.join(root, 'WCC2023.pgn')])
+    return process_games(games, compact=True, double_first_increment=True)
+
+
+def test_move_time_figure_sizes_from_compact_moves(compact_moves):
+    assert compact_moves['Move_label'].dtype == np.int8
+    assert (compact_moves['Move_label'] == 6).any()
+    fig = move_time_figure([('all', compact_moves)])
+    sizes = fig.axes[0].collections[0].get_sizes()
+    plt.close(fig)
+    assert np.array_equal(sizes, compact_moves['Move_label'].to_numpy(dtype=float) ** 3)
+    assert sizes.max() == 216
+
+
+def test_move_time_figure_colors_every_player(compact_moves):
+    #more players than colors: the palette starts over; Ding asks for red and gets it wherever he comes
+    players = [('Ding', compact_moves)] + [('player {}'.format(i), compact_moves.head(10)) for i in range(7)]
+    fig = move_time_figure(players, colors={'Ding': ('Reds', 'red')})
+    legend = fig.axes[0].get_legend()
+    labels = [text.get_text() for text in legend.get_texts()]
+    colors = [patch.get_facecolor() for patch in legend.get_patches()]
+    plt.close(fig)
+    assert labels == [name for name, _ in players]
+    assert colors[0] == matplotlib.colors.to_rgba('red')
+    assert colors[1] == colors[7] == matplotlib.colors.to_rgba('green')
@@ -0,0 +1,15 @@
+import numpy as np
+import pandas as pd
+
+from move_resampling import summary_bootstrap
+
+
+def test_moves_without_times_only_count_as_moves():
+    #game 2 has no clocks
+    moves = pd.DataFrame({'Game_num': [0, 0, 1, 2, 2], 'Player': 'a', 'Verbose_label': 'Good',
+                          'Seconds_spent': [10.0, 20.0, 30.0, np.nan, np.nan], 'Seconds_remaining': [100.0, 90.0, 80.0, np.nan, np.nan]})
+    table = summary_bootstrap(moves, n_resamples=50, workers=1).set_index('Statistic')
+    assert table.loc['Moves', 'Estimate'] == 5
+    assert table.loc['Seconds_spent_mean', 'Estimate'] == 20
+    assert table.loc['Seconds_remaining_mean', 'Estimate'] == 90
+    assert table.loc['Seconds_spent_mean', 'CI_low'] >= 10 and table.loc['Seconds_spent_mean', 'CI_high'] <= 30
@@ -0,0 +1,23 @@
+import os
+
+import pandas as pd
+
+from move_pipeline import process_games
+from parallel_pipeline import process_games_parallel, process_pgn_files_parallel
+from pgn_reader import read_pgn_files
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+pgn_paths = [os.path.join(root, 'WCC2021.pgn'), os.path.join(root, 'WCC2023.pgn')]
+
+
+def test_sharded_run_matches_serial_run():
+    games = read_pgn_files(pgn_paths[1:])
+    serial = process_games(games, compact=True)
+    #shards of 4 games in two worker processes, compacted only after they are put back together
+    parallel = process_games_parallel(games, workers=2, shard_size=4, compact=True)
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+def test_per_file_run_matches_serial_run():
+    serial = process_games(read_pgn_files(pgn_paths))
+    pd.testing.assert_frame_equal(process_pgn_files_parallel(pgn_paths, workers=2), serial)
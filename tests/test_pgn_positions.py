@@ -0,0 +1,97 @@
+import io
+import os
+import sys
+
+from engine_eval import reevaluate_moves
+from pgn_positions import Board, add_position_columns, game_start_fens, replay_game, start_fen
+from pgn_reader import read_games_df, tokenize_movetext
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+stub_engine = [sys.executable, os.path.join(root, 'stub_engine.py')]
+
+set_up_pgn = '''[Event "endgame"]
+[SetUp "1"]
+[FEN "4k3/8/8/8/8/8/4P3/4K2R w K - 0 1"]
+
+1. O-O Kd7 2. e4 Ke6 *
+
+[Event "standard"]
+
+1. e4 e5 *
+'''
+
+
+def test_games_set_up_from_a_fen_replay_from_it(tmp_path):
+    games = read_games_df(io.StringIO(set_up_pgn))
+    assert games['SetUp'].tolist()[0] == '1'
+    assert game_start_fens(games).isna().tolist() == [False, True]
+
+    moves = add_position_columns(tokenize_movetext(games['raw_pgn']), game_start_fens(games))
+    assert moves['Fen'].tolist() == ['4k3/8/8/8/8/8/4P3/5RK1 b - -', '8/3k4/8/8/8/8/4P3/5RK1 w - -',
+                                     '8/3k4/8/8/4P3/8/8/5RK1 b - -', '8/8/4k3/8/4P3/8/8/5RK1 w - -',
+                                     'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq -',
+                                     'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq -']
+
+    #the stub engine scores material: a rook and a pawn up in the set-up game
+    moves = reevaluate_moves(tokenize_movetext(games['raw_pgn']), games, engine=stub_engine, depth=1,
+                             cache_path=str(tmp_path / 'evals.sqlite'))
+    assert moves['Evaluation'].tolist() == ['6.00'] * 4 + ['0.00'] * 2
+
+
+def test_set_up_zero_means_the_start_position():
+    games = read_games_df(io.StringIO('[SetUp "0"]\n[FEN "4k3/8/8/8/8/8/4P3/4K2R w K - 0 1"]\n\n1. e4 *\n'))
+    assert game_start_fens(games).isna().all()
+
+
+def test_moves_onto_own_pieces_are_rejected_with_game_and_ply():
+    for movetext in ['1. Ke2', '1. Nd2', '1. e4 e5 2. Nf3 Nc6 3. Qf3']:
+        moves = tokenize_movetext(['1. d4 d5', movetext])
+        ply = len(moves[moves['Game_num'] == 1]) - 1
+        try:
+            add_position_columns(moves)
+        except ValueError as error:
+            assert str(error).startswith('game 1, ply {}:'.format(ply))
+        else:
+            raise AssertionError('{} was replayed'.format(movetext))
+
+
+def test_en_passant_square_only_when_the_capture_is_legal():
+    #exd6 is legal
+    assert Board('4k3/3p4/8/4P3/8/8/8/4K3 b - - 0 1').push_san('d5').position_key() == '4k3/8/8/3pP3/8/8/8/4K3 w - d6'
+    #the e5 pawn and the d5 pawn both leave the fifth rank, where the rook would then give check
+    assert Board('4k3/3p4/8/r3P2K/8/8/8/8 b - - 0 1').push_san('d5').position_key() == '4k3/8/8/r2pP2K/8/8/8/8 w - -'
+    #the white king is in check from the bishop and taking en passant does not stop it
+    assert Board('4k3/3p4/8/4P3/8/8/1b6/K7 b - - 0 1').push_san('d5').position_key() == '4k3/8/8/3pP3/8/8/1b6/K7 w - -'
+    #no pawn to take with
+    assert Board('4k3/3p4/8/8/8/8/8/4K3 b - - 0 1').push_san('d5').position_key() == '4k3/8/8/3p4/8/8/8/4K3 w - -'
+
+
+def test_replay_castling_promotion_en_passant_and_disambiguation():
+    moves = 'e4 Nf6 e5 d5 exd6 Nbd7 dxc7 e5 cxd8=Q+ Kxd8 Nf3 Bd6 Bc4 Re8 O-O Nb6 Nc3 Nbd5 Nxd5'.split()
+    fens = replay_game(moves)
+    #the d6 square is kept while exd6 is possible, then the pawn on d5 is gone
+    assert fens[3] == 'rnbqkb1r/ppp1pppp/5n2/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6'
+    assert fens[4] == 'rnbqkb1r/ppp1pppp/3P1n2/8/8/8/PPPP1PPP/RNBQKBNR b KQkq -'
+    #Nbd7: the knight on f6 reaches d7 too
+    assert fens[5] == 'r1bqkb1r/pppnpppp/3P1n2/8/8/8/PPPP1PPP/RNBQKBNR w KQkq -'
+    assert fens[8] == 'r1bQkb1r/pp1n1ppp/5n2/4p3/8/8/PPPP1PPP/RNBQKBNR b KQkq -'
+    #the king moves: black loses both castling rights
+    assert fens[9] == 'r1bk1b1r/pp1n1ppp/5n2/4p3/8/8/PPPP1PPP/RNBQKBNR w KQ -'
+    assert fens[14] == 'r1bkr3/pp1n1ppp/3b1n2/4p3/2B5/5N2/PPPP1PPP/RNBQ1RK1 b - -'
+    assert fens[17] == 'r1bkr3/pp3ppp/3b1n2/3np3/2B5/2N2N2/PPPP1PPP/R1BQ1RK1 w - -'
+    assert fens[18] == 'r1bkr3/pp3ppp/3b1n2/3Np3/2B5/5N2/PPPP1PPP/R1BQ1RK1 b - -'
+
+def test_pinned_piece_does_not_count_for_disambiguation():
+    #both knights reach e2, the one on c3 is pinned by the bishop
+    board = Board('4k3/8/8/4b3/8/2N3N1/8/K7 w - - 0 1')
+    assert board.push_san('Ne2').position_key() == '4k3/8/8/4b3/8/2N5/4N3/K7 b - -'
+
+
+def test_illegal_moves_are_rejected():
+    for fen, san in [(start_fen, 'e5'), (start_fen, 'O-O'), (start_fen, 'Ke2'), (start_fen, 'Qxd7'),
+                     ('4k3/8/8/8/8/8/8/R3K2r w Q - 0 1', 'O-O-O'), ('4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1', 'e8=Q')]:
+        try:
+            Board(fen).push_san(san)
+        except ValueError:
+            continue
+        raise AssertionError('{} was played in {}'.format(san, fen))
@@ -0,0 +1,39 @@
+import io
+
+from pgn_reader import read_games_df, strip_variations, tokenize_movetext
+
+
+def test_zero_castling_is_tokenized_as_castling():
+    moves = tokenize_movetext(['1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. 0-0 Nf6 5. d3 0-0 1-0'])
+    assert moves['Move'].tolist()[6:] == ['O-O', 'Nf6', 'd3', 'O-O']
+
+
+def test_variations_are_not_part_of_the_mainline():
+    pgn = ('1. e4 { [%eval 0.3] [%clk 1:59:50] (book) } 1... e5 (1... c5 2. Nf3 (2. c3 { sideline (rare) } d5) 2... d6) '
+           '2. Nf3 { [%clk 1:59:00] } Nc6 *')
+    moves = tokenize_movetext([pgn])
+    assert moves['Move'].tolist() == ['e4', 'e5', 'Nf3', 'Nc6']
+    assert moves['Evaluation'].tolist()[0] == '0.3'
+    #the comments stay with the mainline moves they follow
+    assert moves['Timestamp'].isna().tolist() == [False, True, False, True]
+    assert moves['Timestamp'].dropna().tolist() == ['1:59:50', '1:59:00']
+
+
+def test_parentheses_in_mainline_comments_are_kept():
+    assert strip_variations(['1. e4 { good (!) } (1. d4) e5']).tolist() == ['1. e4 { good (!) }   e5']
+
+
+def test_games_are_read_with_their_movetext():
+    pgn = '[Event "a"]\n[White "x"]\n\n1. e4 e5 1-0\n\n[Event "b"]\n\n1. d4 { comment\n[not a tag] } d5 0-1\n'
+    games = read_games_df(io.StringIO(pgn))
+    assert games['Event'].tolist() == ['a', 'b']
+    assert games['raw_pgn'].tolist()[1] == '1. d4 { comment [not a tag] } d5 0-1'
+
+
+def test_byte_order_mark_and_stray_latin1_bytes(tmp_path):
+    pgn = tmp_path / 'bom.pgn'
+    pgn.write_bytes(b'\xef\xbb\xbf[Event "a"]\n[White "Bj\xf6rn"]\n\n1. e4 e5 1-0\n\n[Event "b"]\n\n1. d4 d5 0-1\n')
+    games = read_games_df(str(pgn))
+    assert games['Event'].tolist() == ['a', 'b']
+    assert games['White'].tolist()[0] == 'Bj�rn'
+    assert games['raw_pgn'].tolist() == ['1. e4 e5 1-0', '1. d4 d5 0-1']
@@ -0,0 +1,13 @@
+import pandas as pd
+
+import render_figures
+
+
+def test_job_hash_changes_with_the_figure_version(monkeypatch):
+    args = (pd.DataFrame({'Ply': [0, 1], 'Seconds_spent': [5.0, 9.0]}),)
+    digest = render_figures.job_hash('game_figure', args, {'title': 'a'})
+    assert render_figures.job_hash('game_figure', args, {'title': 'a'}) == digest
+    assert render_figures.job_hash('game_figure', args, {'title': 'b'}) != digest
+
+    monkeypatch.setattr(render_figures, 'FIGURE_VERSION', render_figures.FIGURE_VERSION + 1)
+    assert render_figures.job_hash('game_figure', args, {'title': 'a'}) != digest